@@ -0,0 +1,85 @@
+import os
+import secrets
+
+from fastapi import APIRouter, Header, HTTPException
+
+from backend.app.services.update_queue import update_queue
+from backend.app.services.update_dedup import update_dedup
+from backend.app.services.rate_limiter import rate_limiter
+from backend.app.db.session import engine
+from backend.app.db.pool import pool_metrics
+from backend.app.services.user_cache import user_cache
+from backend.app.services.tier_engine import lifetime_counts
+from backend.app.services.channel_catalog import channel_catalog
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+# Metrics expose queue state, job errors and pool usage, so
+# they are only served when METRICS_TOKEN is set (404 otherwise)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+def _check_token(token: str | None):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token is None or not secrets.compare_digest(token, METRICS_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+# ======================================================
+# TELEGRAM UPDATE QUEUE
+# ======================================================
+
+@router.get("/updates")
+async def update_metrics(x_metrics_token: str | None = Header(default=None)):
+    _check_token(x_metrics_token)
+    return {**update_queue.stats(), "dedup": update_dedup.stats()}
+
+
+# ======================================================
+# TELEGRAM API RATE LIMITER
+# ======================================================
+
+@router.get("/telegram")
+async def telegram_metrics(x_metrics_token: str | None = Header(default=None)):
+    _check_token(x_metrics_token)
+    return rate_limiter.stats()
+
+
+# ======================================================
+# SCHEDULED JOBS
+# ======================================================
+
+@router.get("/jobs")
+async def job_metrics(x_metrics_token: str | None = Header(default=None)):
+    _check_token(x_metrics_token)
+    from backend.app.tasks.scheduler import job_metrics as metrics, scheduler_leader
+    return {
+        "leader": scheduler_leader.is_leader,
+        "pid": os.getpid(),
+        "jobs": metrics.stats(),
+    }
+
+
+# ======================================================
+# DATABASE CONNECTION POOL
+# ======================================================
+
+@router.get("/db")
+async def db_metrics(x_metrics_token: str | None = Header(default=None)):
+    _check_token(x_metrics_token)
+    return pool_metrics.stats(engine.pool)
+
+
+# ======================================================
+# IN-PROCESS CACHES
+# ======================================================
+
+@router.get("/cache")
+async def cache_metrics(x_metrics_token: str | None = Header(default=None)):
+    _check_token(x_metrics_token)
+    return {
+        "users": user_cache.stats(),
+        "lifetime_counts": lifetime_counts.stats(),
+        "channel_catalog": {"loads": channel_catalog.loads},
+    }
@@ -3,6 +3,9 @@ from sqlalchemy import select, and_
 from datetime import datetime, timedelta, timezone
 from backend.app.db.session import async_session
 from backend.app.db.models import User, Channel, Membership, Payment
+from backend.app.services.reminder_outbox import schedule_reminders
+from backend.app.services.user_cache import user_cache
+from backend.app.services.tier_engine import LIFETIME_DAYS, refresh_lifetime_count
 from backend.bot.bot import bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 import hmac
@@ -62,7 +65,7 @@ async def handle_renewal_payment(db, payment_data, notes):
     
     # RENEWAL FLOW - Check grace period
     if is_renewal and old_membership_id:
-        old_membership = await db.get(Membership, old_membership_id)
+        old_membership = await db.get(Membership, old_membership_id, with_for_update=True)
         
         if old_membership:
             grace_period_end = old_membership.expiry_date + timedelta(hours=48)
@@ -76,7 +79,11 @@ async def handle_renewal_payment(db, payment_data, notes):
                 old_membership.reminded_7d = False
                 old_membership.reminded_1d = False
                 old_membership.reminded_expired = False
+                old_membership.kicked_at = None
+                old_membership.notified_at = None
                 
+                await schedule_reminders(db, old_membership)
+
                 logger.info(f"Extended membership {old_membership_id} by {validity_days} days (grace={within_grace})")
                 await db.commit()
                 return True
@@ -94,6 +101,7 @@ async def handle_renewal_payment(db, payment_data, notes):
                 Membership.is_active == True
             )
         )
+        .with_for_update()
     )
     existing = result.scalar_one_or_none()
     
@@ -103,6 +111,10 @@ async def handle_renewal_payment(db, payment_data, notes):
         existing.amount_paid += amount
         existing.reminded_7d = False
         existing.reminded_1d = False
+        existing.reminded_expired = False
+        existing.kicked_at = None
+        existing.notified_at = None
+        await schedule_reminders(db, existing)
         
         logger.info(f"Extended existing active membership {existing.id} - NO DUPLICATE CREATED")
         await db.commit()
@@ -120,9 +132,12 @@ async def handle_renewal_payment(db, payment_data, notes):
             tier=tier
         )
         db.add(new_membership)
+        await schedule_reminders(db, new_membership)
         
         logger.info(f"Created new membership for user {user.id}, channel {channel_id}")
         await db.commit()
+        if validity_days == LIFETIME_DAYS:
+            await refresh_lifetime_count(db, user.id)
         return True
 
 
@@ -210,6 +225,7 @@ async def handle_payment_captured(data):
             # Update user stats
             user.highest_amount_paid = max(user.highest_amount_paid or 0, amount)
             await db.commit()
+            user_cache.invalidate(user.telegram_id)
 
             # Get channel for messaging
             channel = await db.get(Channel, channel_id)
@@ -336,10 +352,16 @@ async def handle_subscription_charged(data):
             membership = await db.scalar(
                 select(Membership).where(
                     Membership.razorpay_subscription_id == subscription_id
-                )
+                ).with_for_update()
             )
             if membership:
                 membership.expiry_date += timedelta(days=membership.validity_days)
+                membership.reminded_7d = False
+                membership.reminded_1d = False
+                membership.reminded_expired = False
+                membership.kicked_at = None
+                membership.notified_at = None
+                await schedule_reminders(db, membership)
                 await db.commit()
 
     except Exception:
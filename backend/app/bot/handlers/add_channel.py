@@ -5,6 +5,7 @@ from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from backend.app.db.session import async_session
 from backend.app.db.models import Channel
+from backend.app.services.channel_catalog import channel_catalog, notify_channels_changed
 
 router = Router()
 
@@ -68,7 +69,9 @@ async def save_channel(callback: CallbackQuery, state: FSMContext):
             is_active=True
         )
         session.add(channel)
+        await notify_channels_changed(session)
         await session.commit()
+    channel_catalog.invalidate()
     
     visibility_text = "Public (Visible to all)" if is_public else "Private (Hidden until purchased)"
     
@@ -9,12 +9,16 @@ from aiogram.fsm.state import State, StatesGroup
 from sqlalchemy import select
 #D
 from backend.app.db.session import async_session
-from backend.app.db.models import User, Channel, Membership, Payment
+from backend.app.db.models import User, Membership, Payment
+from backend.app.services.reminder_outbox import schedule_reminders
+from backend.app.services.channel_catalog import channel_catalog
+from backend.app.services.user_cache import user_cache
 from backend.app.services.tier_engine import (
     TIER_PLANS,
     calculate_tier_from_amount,
     update_user_tier,
-    get_price_for_validity
+    get_price_for_validity,
+    invalidate_lifetime_count
 )
 
 router = Router()
@@ -110,44 +114,40 @@ async def receive_user_id(message: Message, state: FSMContext):
             existing_user=user is not None
         )
     
-    async with async_session() as session:
-        result = await session.execute(
-            select(Channel).where(Channel.is_active == True).order_by(Channel.id)
-        )
-        channels = result.scalars().all()
-        
-        if not channels:
-            await message.answer("❌ No channels found. Please add channels first with /addchannel")
-            await state.clear()
-            return
-        
-        keyboard = []
-        for channel in channels:
-            visibility = "🔓 Public" if channel.is_public else "🔒 Private"
-            keyboard.append([
-                InlineKeyboardButton(
-                    text=f"{channel.name} ({visibility})",
-                    callback_data=f"adminadd_ch_{channel.id}"
-                )
-            ])
-        
+    channels = await channel_catalog.active()
+    
+    if not channels:
+        await message.answer("❌ No channels found. Please add channels first with /addchannel")
+        await state.clear()
+        return
+    
+    keyboard = []
+    for channel in channels:
+        visibility = "🔓 Public" if channel.is_public else "🔒 Private"
         keyboard.append([
-            InlineKeyboardButton(text="❌ Cancel", callback_data="adminadd_cancel")
+            InlineKeyboardButton(
+                text=f"{channel.name} ({visibility})",
+                callback_data=f"adminadd_ch_{channel.id}"
+            )
         ])
+    
+    keyboard.append([
+        InlineKeyboardButton(text="❌ Cancel", callback_data="adminadd_cancel")
+    ])
 
-        data = await state.get_data()
-        user_display = format_user(data["user_full_name"], data["user_username"], user_telegram_id)
+    data = await state.get_data()
+    user_display = format_user(data["user_full_name"], data["user_username"], user_telegram_id)
 
-        await message.answer(
-            f"👤 <b>Add User</b>\n\n"
-            f"User: {user_display}\n"
-            f"{user_status}\n\n"
-            f"Select the channel user has paid for:",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-            parse_mode="HTML"
-        )
-        
-        await state.set_state(AdminAddUserStates.select_channel)
+    await message.answer(
+        f"👤 <b>Add User</b>\n\n"
+        f"User: {user_display}\n"
+        f"{user_status}\n\n"
+        f"Select the channel user has paid for:",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
+        parse_mode="HTML"
+    )
+    
+    await state.set_state(AdminAddUserStates.select_channel)
 
 
 # =====================================================
@@ -159,36 +159,32 @@ async def channel_selected(callback: CallbackQuery, state: FSMContext):
     """Handle channel selection"""
     channel_id = int(callback.data.split("_")[2])
     
-    async with async_session() as session:
-        result = await session.execute(
-            select(Channel).where(Channel.id == channel_id)
-        )
-        channel = result.scalar_one_or_none()
-        
-        if not channel:
-            await callback.answer("Channel not found", show_alert=True)
-            return
-        
-        await state.update_data(channel_id=channel_id, channel_name=channel.name)
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="1 Month", callback_data="adminadd_val_30")],
-            [InlineKeyboardButton(text="3 Months", callback_data="adminadd_val_90")],
-            [InlineKeyboardButton(text="4 Months", callback_data="adminadd_val_120")],
-            [InlineKeyboardButton(text="6 Months", callback_data="adminadd_val_180")],
-            [InlineKeyboardButton(text="1 Year", callback_data="adminadd_val_365")],
-            [InlineKeyboardButton(text="Lifetime", callback_data="adminadd_val_730")],
-            [InlineKeyboardButton(text="🔙 Back", callback_data="adminadd_back_channel")]
-        ])
-        
-        await callback.message.edit_text(
-            f"📺 <b>Channel:</b> {channel.name}\n\n"
-            f"Select validity period:",
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
-        
-        await state.set_state(AdminAddUserStates.select_validity)
+    channel = await channel_catalog.get(channel_id)
+    
+    if not channel:
+        await callback.answer("Channel not found", show_alert=True)
+        return
+    
+    await state.update_data(channel_id=channel_id, channel_name=channel.name)
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="1 Month", callback_data="adminadd_val_30")],
+        [InlineKeyboardButton(text="3 Months", callback_data="adminadd_val_90")],
+        [InlineKeyboardButton(text="4 Months", callback_data="adminadd_val_120")],
+        [InlineKeyboardButton(text="6 Months", callback_data="adminadd_val_180")],
+        [InlineKeyboardButton(text="1 Year", callback_data="adminadd_val_365")],
+        [InlineKeyboardButton(text="Lifetime", callback_data="adminadd_val_730")],
+        [InlineKeyboardButton(text="🔙 Back", callback_data="adminadd_back_channel")]
+    ])
+    
+    await callback.message.edit_text(
+        f"📺 <b>Channel:</b> {channel.name}\n\n"
+        f"Select validity period:",
+        reply_markup=keyboard,
+        parse_mode="HTML"
+    )
+    
+    await state.set_state(AdminAddUserStates.select_validity)
     
     await callback.answer()
 
@@ -402,10 +398,7 @@ async def confirm_and_activate(callback: CallbackQuery, state: FSMContext):
                 await state.clear()
                 return
             
-            channel_result = await session.execute(
-                select(Channel).where(Channel.id == data["channel_id"])
-            )
-            channel = channel_result.scalar_one_or_none()
+            channel = await channel_catalog.get(data["channel_id"])
             
             if not channel:
                 await callback.message.edit_text("❌ Channel not found.")
@@ -449,6 +442,7 @@ async def confirm_and_activate(callback: CallbackQuery, state: FSMContext):
                 is_active=True
             )
             session.add(membership)
+            await schedule_reminders(session, membership)
 
             # ── Add Payment record for revenue tracking ──────────────
             session.add(Payment(
@@ -460,6 +454,8 @@ async def confirm_and_activate(callback: CallbackQuery, state: FSMContext):
             ))
 
             await session.commit()
+            user_cache.invalidate(user.telegram_id)
+            invalidate_lifetime_count(user.id)
 
             user_display = format_user(data["user_full_name"], data["user_username"], data["user_telegram_id"])
 
@@ -564,34 +560,30 @@ async def back_to_channel_selection(callback: CallbackQuery, state: FSMContext):
     """Go back to channel selection"""
     data = await state.get_data()
     
-    async with async_session() as session:
-        result = await session.execute(
-            select(Channel).where(Channel.is_active == True).order_by(Channel.id)
-        )
-        channels = result.scalars().all()
-        
-        keyboard = []
-        for channel in channels:
-            visibility = "🔓 Public" if channel.is_public else "🔒 Private"
-            keyboard.append([
-                InlineKeyboardButton(
-                    text=f"{channel.name} ({visibility})",
-                    callback_data=f"adminadd_ch_{channel.id}"
-                )
-            ])
-        
+    channels = await channel_catalog.active()
+    
+    keyboard = []
+    for channel in channels:
+        visibility = "🔓 Public" if channel.is_public else "🔒 Private"
         keyboard.append([
-            InlineKeyboardButton(text="❌ Cancel", callback_data="adminadd_cancel")
+            InlineKeyboardButton(
+                text=f"{channel.name} ({visibility})",
+                callback_data=f"adminadd_ch_{channel.id}"
+            )
         ])
-        
-        await callback.message.edit_text(
-            f"👤 <b>Add User</b>\n\n"
-            f"User ID: <code>{data['user_telegram_id']}</code>\n\n"
-            f"Select the channel user has paid for:",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-            parse_mode="HTML"
-        )
-        
-        await state.set_state(AdminAddUserStates.select_channel)
+    
+    keyboard.append([
+        InlineKeyboardButton(text="❌ Cancel", callback_data="adminadd_cancel")
+    ])
+    
+    await callback.message.edit_text(
+        f"👤 <b>Add User</b>\n\n"
+        f"User ID: <code>{data['user_telegram_id']}</code>\n\n"
+        f"Select the channel user has paid for:",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
+        parse_mode="HTML"
+    )
+    
+    await state.set_state(AdminAddUserStates.select_channel)
     
     await callback.answer()
\ No newline at end of file
@@ -12,6 +12,8 @@ from sqlalchemy import select, func
 
 from backend.app.db.session import async_session
 from backend.app.db.models import User, Channel, Membership, Payment
+from backend.app.services.user_cache import user_cache
+from backend.app.services.tier_engine import LIFETIME_DAYS, refresh_lifetime_count
 
 router = Router()
 
@@ -791,6 +793,7 @@ async def handle_csv_import(message: Message):
                     f"   {channel_name} — already has active membership"
                 )
                 await session.commit()
+                user_cache.invalidate(telegram_id)
                 continue
 
             session.add(Membership(
@@ -803,6 +806,9 @@ async def handle_csv_import(message: Message):
                 is_active=is_active
             ))
             await session.commit()
+            user_cache.invalidate(telegram_id)
+            if validity_days == LIFETIME_DAYS:
+                await refresh_lifetime_count(session, user.id)
 
             if is_active and channel:
                 try:
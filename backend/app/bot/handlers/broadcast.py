@@ -1,15 +1,20 @@
 import os
-import asyncio
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy import select
+from sqlalchemy import select, func, distinct
 
 from backend.app.db.session import async_session
-from backend.app.db.models import User, Membership, Channel
-from backend.bot.bot import bot
+from backend.app.db.models import User, Membership
+from backend.app.services.channel_catalog import channel_catalog
+from backend.app.services.broadcast_engine import (
+    create_broadcast,
+    pause_broadcast,
+    resume_broadcast,
+    cancel_broadcast,
+)
 
 router = Router()
 
@@ -127,9 +132,7 @@ async def bc_receive_user_ids(message: Message, state: FSMContext):
 
 @router.callback_query(F.data == "bc_audience_channel")
 async def bc_audience_channel(callback: CallbackQuery, state: FSMContext):
-    async with async_session() as session:
-        result = await session.execute(select(Channel).where(Channel.is_active == True))
-        channels = result.scalars().all()
+    channels = await channel_catalog.active()
 
     if not channels:
         await callback.message.edit_text(
@@ -160,23 +163,24 @@ async def bc_audience_channel(callback: CallbackQuery, state: FSMContext):
 async def bc_channel_selected(callback: CallbackQuery, state: FSMContext):
     channel_id = int(callback.data.split("_")[2])
 
+    channel = await channel_catalog.get(channel_id)
     async with async_session() as session:
-        channel = await session.get(Channel, channel_id)
         result = await session.execute(
-            select(User.telegram_id)
-            .join(Membership, Membership.user_id == User.id)
+            select(func.count(distinct(Membership.user_id)))
+            .join(User, User.id == Membership.user_id)
             .where(
                 Membership.channel_id == channel_id,
-                Membership.is_active == True
+                Membership.is_active == True,
+                User.is_blocked == False
             )
         )
-        ids = [r[0] for r in result.fetchall()]
+        member_count = result.scalar() or 0
 
-    await state.update_data(audience="channel", target_ids=ids, channel_name=channel.name)
+    await state.update_data(audience="channel", channel_id=channel_id, member_count=member_count, channel_name=channel.name)
     await state.set_state(BroadcastStates.waiting_message)
 
     await callback.message.edit_text(
-        f"✅ <b>{len(ids)} active member(s)</b> in {channel.name}\n\n"
+        f"✅ <b>{member_count} active member(s)</b> in {channel.name}\n\n"
         "Now send your message.\n"
         "Supports text, images, links, and emojis 👇",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -214,14 +218,14 @@ async def bc_receive_message(message: Message, state: FSMContext):
     # Audience label
     if audience == "all":
         async with async_session() as session:
-            result = await session.execute(select(User.telegram_id))
-            count = len(result.fetchall())
+            result = await session.execute(select(func.count()).select_from(User).where(User.is_blocked == False))
+            count = result.scalar() or 0
         audience_label = f"👥 All Users ({count} total)"
     elif audience == "specific":
         audience_label = f"🎯 Specific Users ({len(target_ids)} selected)"
     else:
         channel_name = data.get("channel_name", "channel")
-        audience_label = f"📺 {channel_name} members ({len(target_ids)} active)"
+        audience_label = f"📺 {channel_name} members ({data.get('member_count', 0)} active)"
 
     await message.answer(
         f"📋 <b>Confirm Broadcast</b>\n\n"
@@ -257,50 +261,48 @@ async def bc_confirm_send(callback: CallbackQuery, state: FSMContext):
 
     await state.clear()
 
-    # Get all user IDs if audience is all
-    if audience == "all":
-        async with async_session() as session:
-            result = await session.execute(select(User.telegram_id))
-            target_ids = [r[0] for r in result.fetchall()]
-
-    await callback.message.edit_text("📤 Sending... please wait.")
-
-    sent = 0
-    failed = 0
-
-    for tg_id in target_ids:
-        try:
-            if has_photo and photo_id:
-                await bot.send_photo(
-                    chat_id=tg_id,
-                    photo=photo_id,
-                    caption=caption or "",
-                    parse_mode="HTML"
-                )
-            else:
-                await bot.send_message(
-                    chat_id=tg_id,
-                    text=text or "",
-                    parse_mode="HTML"
-                )
-            sent += 1
-            await asyncio.sleep(0.05)  # Prevent spam detection
-        except Exception:
-            failed += 1
-
-    await callback.message.edit_text(
-        f"✅ <b>Broadcast Complete</b>\n\n"
-        f"📤 Sent: {sent}\n"
-        f"❌ Failed: {failed}\n"
-        f"📊 Total: {sent + failed}",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔙 Back to Admin Panel", callback_data="admin_back_main")]
-        ]),
-        parse_mode="HTML"
+    progress = await callback.message.edit_text("📤 <b>Preparing broadcast...</b>", parse_mode="HTML")
+
+    await create_broadcast(
+        audience,
+        text=text,
+        photo_id=photo_id if has_photo else None,
+        caption=caption,
+        channel_id=data.get("channel_id"),
+        target_ids=target_ids if audience == "specific" else None,
+        created_by=callback.from_user.id,
+        progress_chat_id=progress.chat.id,
+        progress_message_id=progress.message_id,
     )
     await callback.answer()
 
 
+# =====================================================
+# JOB CONTROLS: pause / resume / cancel
+# =====================================================
+
+@router.callback_query(F.data.startswith("bc_job_"))
+async def bc_job_control(callback: CallbackQuery):
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("⛔ Not authorized", show_alert=True)
+        return
+
+    _, _, action, job_id = callback.data.split("_")
+    job_id = int(job_id)
+
+    if action == "pause":
+        ok = await pause_broadcast(job_id)
+        await callback.answer("⏸ Pausing after the current batch..." if ok else "Job is not running")
+    elif action == "resume":
+        ok = await resume_broadcast(job_id)
+        await callback.answer("▶️ Resumed" if ok else "Job is not paused")
+    elif action == "cancel":
+        ok = await cancel_broadcast(job_id)
+        await callback.answer("🛑 Cancelling..." if ok else "Job already finished")
+    else:
+        await callback.answer()
+
+
 # =====================================================
 # LEGACY COMMANDS (kept for backward compatibility)
 # =====================================================
@@ -313,17 +315,14 @@ async def broadcast_all(message: Message, command: CommandObject):
         await message.answer("Usage:\n/broadcast your message here")
         return
     text = command.args
-    async with async_session() as session:
-        result = await session.execute(select(User.telegram_id))
-        users = [r[0] for r in result.fetchall()]
-    sent = 0
-    for tg_id in users:
-        try:
-            await message.bot.send_message(tg_id, text)
-            sent += 1
-        except:
-            pass
-    await message.answer(f"✅ Sent to {sent} users")
+    progress = await message.answer("📤 <b>Preparing broadcast...</b>", parse_mode="HTML")
+    await create_broadcast(
+        "all",
+        text=text,
+        created_by=message.from_user.id,
+        progress_chat_id=progress.chat.id,
+        progress_message_id=progress.message_id,
+    )
 
 
 @router.message(Command("broadcast_channel"))
@@ -339,18 +338,15 @@ async def broadcast_channel(message: Message, command: CommandObject):
         return
     channel_id = int(parts[0])
     text = parts[1]
-    async with async_session() as session:
-        result = await session.execute(
-            select(User.telegram_id)
-            .join(Membership, Membership.user_id == User.id)
-            .where(Membership.channel_id == channel_id, Membership.is_active == True)
-        )
-        users = [r[0] for r in result.fetchall()]
-    sent = 0
-    for tg_id in users:
-        try:
-            await message.bot.send_message(tg_id, text)
-            sent += 1
-        except:
-            pass
-    await message.answer(f"✅ Sent to {sent} users of channel {channel_id}")
\ No newline at end of file
+    progress = await message.answer(
+        f"📤 <b>Preparing broadcast to channel {channel_id}...</b>",
+        parse_mode="HTML"
+    )
+    await create_broadcast(
+        "channel",
+        text=text,
+        channel_id=channel_id,
+        created_by=message.from_user.id,
+        progress_chat_id=progress.chat.id,
+        progress_message_id=progress.message_id,
+    )
@@ -4,12 +4,16 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, Message
 from aiogram.exceptions import TelegramBadRequest
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.app.db.session import async_session
-from backend.app.db.models import Channel, User
+from backend.app.db.models import Membership
 from backend.app.bot.handlers.upi_payment import show_upi_payment
+from backend.app.services.channel_catalog import channel_catalog
+from backend.app.services.user_cache import UserSnapshot, user_cache
 from backend.app.services.tier_engine import (
+    LIFETIME_DAYS,
     get_plans_for_user,
+    refresh_lifetime_count,
     format_plan_display
 )
 
@@ -26,39 +30,24 @@ CHANNEL_EMOJIS = {
 # REUSABLE: SEND CHANNEL LIST
 # =====================================================
 
-async def send_channel_list(message: Message, telegram_id: int, edit: bool = False):
+async def send_channel_list(message: Message, session: AsyncSession, user: UserSnapshot | None, edit: bool = False):
     """Reusable function to show channel list — called from start.py Membership button."""
-    async with async_session() as session:
-        user_result = await session.execute(
-            select(User).where(User.telegram_id == telegram_id)
-        )
-        user = user_result.scalar_one_or_none()
-
-        if not user:
-            text = "❌ User not found. Please send /start first."
-            if edit:
-                await message.edit_text(text)
-            else:
-                await message.answer(text)
-            return
+    if not user:
+        text = "❌ User not found. Please send /start first."
+        if edit:
+            await message.edit_text(text)
+        else:
+            await message.answer(text)
+        return
 
-        from backend.app.db.models import Membership
-        membership_result = await session.execute(
-            select(Membership.channel_id)
-            .where(Membership.user_id == user.id)
-            .distinct()
-        )
-        purchased_channel_ids = [row[0] for row in membership_result.all()]
+    membership_result = await session.execute(
+        select(Membership.channel_id)
+        .where(Membership.user_id == user.id)
+        .distinct()
+    )
+    purchased_channel_ids = [row[0] for row in membership_result.all()]
 
-        channel_result = await session.execute(
-            select(Channel)
-            .where(
-                Channel.is_active == True,
-                (Channel.is_public == True) | (Channel.id.in_(purchased_channel_ids))
-            )
-            .order_by(Channel.id)
-        )
-        channels = channel_result.scalars().all()
+    channels = await channel_catalog.visible_to(purchased_channel_ids)
 
     if not channels:
         text = "❌ No channels available at the moment.\nPlease check back later!"
@@ -104,71 +93,62 @@ async def send_channel_list(message: Message, telegram_id: int, edit: bool = Fal
 # =====================================================
 
 @router.callback_query(F.data.startswith("userch_"))
-async def show_channel_plans(callback: CallbackQuery):
+async def show_channel_plans(callback: CallbackQuery, session: AsyncSession, db_user: UserSnapshot | None):
     """Show pricing plans when user selects a channel"""
     try:
         channel_id = int(callback.data.split("_")[1])
         
-        async with async_session() as session:
-            channel_result = await session.execute(
-                select(Channel).where(Channel.id == channel_id)
-            )
-            channel = channel_result.scalar_one_or_none()
-            
-            if not channel:
-                await callback.answer("Channel not found", show_alert=True)
-                return
-            
-            user_result = await session.execute(
-                select(User).where(User.telegram_id == callback.from_user.id)
-            )
-            user = user_result.scalar_one_or_none()
-            
-            if not user:
-                await callback.answer("User not found. Please start with /start", show_alert=True)
-                return
-            
-            plans = await get_plans_for_user(user, channel_id, session)
-            
-            if not plans:
-                await callback.answer("No plans available", show_alert=True)
-                return
-            
-            keyboard = []
-
-            if channel.is_public and channel.description:
-                keyboard.append([
-                    InlineKeyboardButton(
-                        text="ℹ️ Channel Description",
-                        callback_data=f"ch_desc_{channel_id}"
-                    )
-                ])
-
-            for index, plan in enumerate(plans):
-                button_text = format_plan_display(plan)
-                keyboard.append([
-                    InlineKeyboardButton(
-                        text=button_text,
-                        callback_data=f"buy_{channel_id}_{plan['days']}_{plan['price']}"
-                    )
-                ])
-            
+        channel = await channel_catalog.get(channel_id)
+        
+        if not channel:
+            await callback.answer("Channel not found", show_alert=True)
+            return
+        
+        if not db_user:
+            await callback.answer("User not found. Please start with /start", show_alert=True)
+            return
+        
+        plans = await get_plans_for_user(db_user, channel_id, session)
+        
+        if not plans:
+            await callback.answer("No plans available", show_alert=True)
+            return
+        
+        keyboard = []
+
+        if channel.is_public and channel.description:
             keyboard.append([
-                InlineKeyboardButton(text="🔙 Back to Channels", callback_data="back_to_channels")
+                InlineKeyboardButton(
+                    text="ℹ️ Channel Description",
+                    callback_data=f"ch_desc_{channel_id}"
+                )
             ])
-            
-            try:
-                await callback.message.edit_text(
-                    f"📺 <b>{channel.name}</b>\n\n"
-                    f"Choose your subscription plan:\n"
-                    f"⚡ Instant access after payment",
-                    reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-                    parse_mode="HTML"
+
+        for index, plan in enumerate(plans):
+            button_text = format_plan_display(plan)
+            keyboard.append([
+                InlineKeyboardButton(
+                    text=button_text,
+                    callback_data=f"buy_{channel_id}_{plan['days']}_{plan['price']}"
                 )
-                await callback.answer()
-            except TelegramBadRequest:
-                await callback.answer()
-    
+            ])
+        
+        keyboard.append([
+            InlineKeyboardButton(text="🔙 Back to Channels", callback_data="back_to_channels")
+        ])
+        
+        try:
+            await callback.message.edit_text(
+                f"📺 <b>{channel.name}</b>\n\n"
+                f"Choose your subscription plan:\n"
+                f"⚡ Instant access after payment",
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
+                parse_mode="HTML"
+            )
+            await callback.answer()
+        except TelegramBadRequest:
+            await callback.answer()
+
     except Exception as e:
         await callback.answer(f"Error: {str(e)}", show_alert=True)
 
@@ -177,7 +157,7 @@ async def show_channel_plans(callback: CallbackQuery):
 # HANDLE PLAN PURCHASE
 # =====================================================
 @router.callback_query(F.data.startswith("buy_"))
-async def handle_plan_purchase(callback: CallbackQuery, state: FSMContext):
+async def handle_plan_purchase(callback: CallbackQuery, state: FSMContext, session: AsyncSession, db_user: UserSnapshot | None):
     """Route to UPI payment when user selects a plan"""
     print("=" * 60)
     print("🎯 PAYMENT HANDLER TRIGGERED")
@@ -198,43 +178,49 @@ async def handle_plan_purchase(callback: CallbackQuery, state: FSMContext):
         print(f"   Validity days: {validity_days}")
         print(f"   Amount: {amount}")
         
-        async with async_session() as session:
-            print(f"🔍 Looking up channel {channel_id}...")
-            channel_result = await session.execute(
-                select(Channel).where(Channel.id == channel_id)
-            )
-            channel = channel_result.scalar_one_or_none()
-            
-            if not channel:
-                print(f"❌ Channel {channel_id} not found!")
-                await callback.answer("Channel not found", show_alert=True)
-                return
-            
-            print(f"✅ Found channel: {channel.name}")
-            
-            print(f"🔍 Looking up user {callback.from_user.id}...")
-            user_result = await session.execute(
-                select(User).where(User.telegram_id == callback.from_user.id)
-            )
-            user = user_result.scalar_one_or_none()
-            
-            if not user:
-                print(f"❌ User {callback.from_user.id} not found!")
-                await callback.answer("User not found", show_alert=True)
+        print(f"🔍 Looking up channel {channel_id}...")
+        channel = await channel_catalog.get(channel_id)
+        
+        if not channel:
+            print(f"❌ Channel {channel_id} not found!")
+            await callback.answer("Channel not found", show_alert=True)
+            return
+        
+        print(f"✅ Found channel: {channel.name}")
+        
+        if not db_user:
+            print(f"❌ User {callback.from_user.id} not found!")
+            await callback.answer("User not found", show_alert=True)
+            return
+        
+        print(f"✅ Found user: ID={db_user.id}, Telegram ID={db_user.telegram_id}")
+
+        if validity_days == LIFETIME_DAYS:
+            # The plan screen priced this from per-process caches;
+            # charge the price for the user's current lifetime count
+            user_cache.invalidate(db_user.telegram_id)
+            db_user = await user_cache.load(session, db_user.telegram_id)
+            await refresh_lifetime_count(session, db_user.id)
+            plans = await get_plans_for_user(db_user, channel_id, session)
+            current = next((p["price"] for p in plans if p["days"] == validity_days), None)
+            if current is None:
+                await callback.answer("This plan is no longer available", show_alert=True)
                 return
-            
-            print(f"✅ Found user: ID={user.id}, Telegram ID={user.telegram_id}")
-            print(f"✅ Routing to UPI payment flow")
-
-            await show_upi_payment(
-                callback=callback,
-                channel_id=channel.id,
-                days=validity_days,
-                price=amount,
-                channel_name=channel.name,
-                state=state
-            )
-    
+            if current != amount:
+                print(f"💎 Lifetime price changed since the plan screen: ₹{amount} → ₹{current}")
+                amount = current
+
+        print(f"✅ Routing to UPI payment flow")
+
+        await show_upi_payment(
+            callback=callback,
+            channel_id=channel.id,
+            days=validity_days,
+            price=amount,
+            channel_name=channel.name,
+            state=state
+        )
+
     except Exception as e:
         print("=" * 60)
         print(f"❌ CRITICAL ERROR in handle_plan_purchase:")
@@ -252,13 +238,13 @@ async def handle_plan_purchase(callback: CallbackQuery, state: FSMContext):
 # =====================================================
 
 @router.callback_query(F.data == "back_to_channels")
-async def back_to_channels(callback: CallbackQuery):
+async def back_to_channels(callback: CallbackQuery, session: AsyncSession, db_user: UserSnapshot | None):
     """Return to channel selection"""
     try:
         await callback.answer()
     except Exception:
         pass
-    await send_channel_list(callback.message, callback.from_user.id, edit=True)
+    await send_channel_list(callback.message, session, db_user, edit=True)
 
 
 # =====================================================
@@ -266,51 +252,46 @@ async def back_to_channels(callback: CallbackQuery):
 # =====================================================
 
 @router.callback_query(F.data.startswith("ch_desc_"))
-async def show_channel_description(callback: CallbackQuery):
+async def show_channel_description(callback: CallbackQuery, session: AsyncSession, db_user: UserSnapshot | None):
     try:
         channel_id = int(callback.data.split("_")[2])
 
-        async with async_session() as session:
-            channel_result = await session.execute(
-                select(Channel).where(Channel.id == channel_id)
-            )
-            channel = channel_result.scalar_one_or_none()
+        channel = await channel_catalog.get(channel_id)
 
-            if not channel:
-                await callback.answer("Channel not found", show_alert=True)
-                return
+        if not channel:
+            await callback.answer("Channel not found", show_alert=True)
+            return
 
-            user_result = await session.execute(
-                select(User).where(User.telegram_id == callback.from_user.id)
-            )
-            user = user_result.scalar_one_or_none()
-
-            plans = get_plans_for_user(user, channel_id)
-
-            keyboard = []
-            for plan in plans:
-                button_text = format_plan_display(plan)
-                keyboard.append([
-                    InlineKeyboardButton(
-                        text=button_text,
-                        callback_data=f"buy_{channel_id}_{plan['days']}_{plan['price']}"
-                    )
-                ])
+        if not db_user:
+            await callback.answer("User not found. Please start with /start", show_alert=True)
+            return
+
+        plans = await get_plans_for_user(db_user, channel_id, session)
+
+        keyboard = []
+        for plan in plans:
+            button_text = format_plan_display(plan)
             keyboard.append([
-                InlineKeyboardButton(text="🔙 Back", callback_data=f"userch_{channel_id}")
+                InlineKeyboardButton(
+                    text=button_text,
+                    callback_data=f"buy_{channel_id}_{plan['days']}_{plan['price']}"
+                )
             ])
+        keyboard.append([
+            InlineKeyboardButton(text="🔙 Back", callback_data=f"userch_{channel_id}")
+        ])
 
-            try:
-                await callback.message.edit_text(
-                    f"📺 <b>{channel.name}</b>\n\n"
-                    f"{channel.description}\n\n"
-                    f"Choose your subscription plan:",
-                    reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-                    parse_mode="HTML"
-                )
-                await callback.answer()
-            except TelegramBadRequest:
-                await callback.answer()
+        try:
+            await callback.message.edit_text(
+                f"📺 <b>{channel.name}</b>\n\n"
+                f"{channel.description}\n\n"
+                f"Choose your subscription plan:",
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
+                parse_mode="HTML"
+            )
+            await callback.answer()
+        except TelegramBadRequest:
+            await callback.answer()
 
     except Exception as e:
         await callback.answer(f"Error: {str(e)}", show_alert=True)
\ No newline at end of file
@@ -8,6 +8,7 @@ from sqlalchemy import select, func
 #d
 from backend.app.db.session import async_session
 from backend.app.db.models import User, Membership, Channel
+from backend.app.services.channel_catalog import channel_catalog
 
 router = Router()
 
@@ -136,9 +137,8 @@ async def _show_members(message, sort: str, ch_id: int, page: int, edit: bool =
 
     ch_label = ""
     if ch_id != 0:
-        async with async_session() as session:
-            ch = await session.get(Channel, ch_id)
-            ch_label = f" — {ch.name}" if ch else ""
+        ch = await channel_catalog.get(ch_id)
+        ch_label = f" — {ch.name}" if ch else ""
 
     sort_label = SORT_LABELS.get(sort, "Members")
     msg = f"👥 <b>{sort_label}{ch_label}</b>\n"
@@ -255,11 +255,7 @@ async def channel_filter_menu(callback: CallbackQuery):
     except Exception:
         pass
 
-    async with async_session() as session:
-        result = await session.execute(
-            select(Channel).where(Channel.is_active == True).order_by(Channel.id)
-        )
-        channels = result.scalars().all()
+    channels = await channel_catalog.active()
 
     keyboard = []
     for ch in channels:
@@ -285,8 +281,7 @@ async def channel_filter_selected(callback: CallbackQuery):
 
     ch_id = int(callback.data.split("_")[2])
 
-    async with async_session() as session:
-        ch = await session.get(Channel, ch_id)
+    ch = await channel_catalog.get(ch_id)
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
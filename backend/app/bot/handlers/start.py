@@ -3,10 +3,11 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, BotCommand, BotCommandScopeChat
 from aiogram.filters import Command
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.app.db.session import async_session
 from backend.app.db.models import User, Channel, Membership
+from backend.app.services.blocked_users import clear_blocked
+from backend.app.services.user_cache import UserSnapshot, user_cache
 
 router = Router()
 
@@ -63,64 +64,59 @@ async def set_commands_for_user(bot, telegram_id: int):
 # =====================================================
 
 @router.message(Command("start"))
-async def start_command(message: Message):
+async def start_command(message: Message, session: AsyncSession, db_user: UserSnapshot | None):
     telegram_id = message.from_user.id
 
-    async with async_session() as session:
-        # Get or create user
-        result = await session.execute(
-            select(User).where(User.telegram_id == telegram_id)
+    # Get or create user
+    if not db_user:
+        user = User(
+            telegram_id=telegram_id,
+            username=message.from_user.username,
+            full_name=message.from_user.full_name,
+            current_tier=3
         )
-        user = result.scalar_one_or_none()
-
-        if not user:
-            user = User(
-                telegram_id=telegram_id,
-                username=message.from_user.username,
-                full_name=message.from_user.full_name,
-                current_tier=3
-            )
-            session.add(user)
+        session.add(user)
+        await session.commit()
+        await session.refresh(user)
+        user_id = user.id
+    else:
+        user_id = db_user.id
+        if db_user.is_blocked:
+            # They are talking to us again — reachable
+            user = await session.get(User, user_id)
+            clear_blocked(user)
             await session.commit()
-            await session.refresh(user)
-
-        # Get user's purchased channels
-        membership_result = await session.execute(
-            select(Membership.channel_id)
-            .where(Membership.user_id == user.id)
-            .distinct()
-        )
-        purchased_channel_ids = [row[0] for row in membership_result.all()]
+            user_cache.invalidate(telegram_id)
+
+    # Check if user has any active memberships
+    active_check = await session.execute(
+        select(Membership.id).where(
+            Membership.user_id == user_id,
+            Membership.is_active == True
+        ).limit(1)
+    )
+    has_active = active_check.scalar_one_or_none() is not None
 
-        # Check if user has any active memberships
-        active_check = await session.execute(
-            select(Membership).where(
-                Membership.user_id == user.id,
-                Membership.is_active == True
-            )
-        )
-        has_active = active_check.scalars().first()
+    # ── Set scoped menu commands for this user ──────────────
+    try:
+        from backend.bot.bot import bot
+        await set_commands_for_user(bot, telegram_id)
+    except Exception as e:
+        print(f"[START] Could not set commands: {e}")
 
-        # ── Set scoped menu commands for this user ──────────────
+    if not has_active and telegram_id not in ADMIN_IDS:
         try:
-            from backend.bot.bot import bot
-            await set_commands_for_user(bot, telegram_id)
+            await message.answer(
+                "⏳ *Your Access is Being Activated*\n\n"
+                "We are currently setting up your premium membership 🔐\n"
+                "⚡ This usually takes a short time.\n\n"
+                "📩 You will receive your access link here once it's ready.\n\n"
+                "🔥 Welcome to Doroide Premium",
+                parse_mode="Markdown"
+            )
         except Exception as e:
-            print(f"[START] Could not set commands: {e}")
-
-        if not has_active and telegram_id not in ADMIN_IDS:
-            try:
-                await message.answer(
-                    "⏳ *Your Access is Being Activated*\n\n"
-                    "We are currently setting up your premium membership 🔐\n"
-                    "⚡ This usually takes a short time.\n\n"
-                    "📩 You will receive your access link here once it's ready.\n\n"
-                    "🔥 Welcome to Doroide Premium",
-                    parse_mode="Markdown"
-                )
-            except Exception as e:
-                print(f"[START] Could not send activation message: {e}")
-            return
+            print(f"[START] Could not send activation message: {e}")
+        return
 
     # Build main menu keyboard
     keyboard = [
@@ -153,9 +149,9 @@ async def start_command(message: Message):
 # =====================================================
 
 @router.message(Command("membership"))
-async def membership_command(message: Message):
+async def membership_command(message: Message, session: AsyncSession, db_user: UserSnapshot | None):
     from backend.app.bot.handlers.channel_plans import send_channel_list
-    await send_channel_list(message, message.from_user.id, edit=False)
+    await send_channel_list(message, session, db_user, edit=False)
 
 
 # =====================================================
@@ -163,82 +159,76 @@ async def membership_command(message: Message):
 # =====================================================
 
 @router.message(Command("offers"))
-async def offers_command(message: Message):
+async def offers_command(message: Message, session: AsyncSession, db_user: UserSnapshot | None):
     from backend.app.db.models import UpsellAttempt
     from sqlalchemy import and_
 
-    async with async_session() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
-        user = result.scalar_one_or_none()
-
-        if not user:
-            await message.answer("❌ User not found. Please send /start first.")
-            return
-
-        result = await session.execute(
-            select(UpsellAttempt).where(
-                and_(
-                    UpsellAttempt.user_id == user.id,
-                    UpsellAttempt.accepted == False
-                )
-            )
-        )
-        upsells = result.scalars().all()
+    if not db_user:
+        await message.answer("❌ User not found. Please send /start first.")
+        return
 
-        if not upsells:
-            await message.answer(
-                "😊 No special offers available right now.",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="🏠 Back to Home", callback_data="menu_back_home")]
-                ])
+    result = await session.execute(
+        select(UpsellAttempt).where(
+            and_(
+                UpsellAttempt.user_id == db_user.id,
+                UpsellAttempt.accepted == False
             )
-            return
+        )
+    )
+    upsells = result.scalars().all()
 
-        msg = "⏳ *Launch Offer — Limited Time*\n\n"
-        keyboard_buttons = []
+    if not upsells:
+        await message.answer(
+            "😊 No special offers available right now.",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🏠 Back to Home", callback_data="menu_back_home")]
+            ])
+        )
+        return
 
-        for upsell in upsells:
-            channel = await session.get(Channel, upsell.channel_id)
-            if not channel:
-                continue
+    msg = "⏳ *Launch Offer — Limited Time*\n\n"
+    keyboard_buttons = []
 
-            duration_map = {30: "1 Month", 90: "3 Months", 120: "4 Months", 180: "6 Months", 365: "1 Year"}
-            from_duration = duration_map.get(upsell.from_validity_days, f"{upsell.from_validity_days} days")
-            to_duration = duration_map.get(upsell.to_validity_days, f"{upsell.to_validity_days} days")
+    for upsell in upsells:
+        channel = await session.get(Channel, upsell.channel_id)
+        if not channel:
+            continue
 
-            original_price = float(upsell.to_amount) / 0.8
-            discount_pct = (float(upsell.discount_amount) / original_price) * 100
+        duration_map = {30: "1 Month", 90: "3 Months", 120: "4 Months", 180: "6 Months", 365: "1 Year"}
+        from_duration = duration_map.get(upsell.from_validity_days, f"{upsell.from_validity_days} days")
+        to_duration = duration_map.get(upsell.to_validity_days, f"{upsell.to_validity_days} days")
 
-            if upsell.is_manual and upsell.custom_message:
-                msg += f"✨ *{upsell.custom_message}*\n\n"
+        original_price = float(upsell.to_amount) / 0.8
+        discount_pct = (float(upsell.discount_amount) / original_price) * 100
 
-            msg += f"📺 *{channel.name}*\n"
-            msg += f"📈 Upgrade Plan\n"
-            msg += f"{from_duration} → {to_duration}\n"
-            msg += f"💰 ₹{original_price:.0f} → ₹{float(upsell.to_amount):.0f}\n"
-            msg += f"🎉 Save ₹{float(upsell.discount_amount):.0f} • {discount_pct:.0f}% OFF\n"
+        if upsell.is_manual and upsell.custom_message:
+            msg += f"✨ *{upsell.custom_message}*\n\n"
 
-            if upsell.is_manual:
-                msg += f"🎁 *Special admin offer!*\n"
+        msg += f"📺 *{channel.name}*\n"
+        msg += f"📈 Upgrade Plan\n"
+        msg += f"{from_duration} → {to_duration}\n"
+        msg += f"💰 ₹{original_price:.0f} → ₹{float(upsell.to_amount):.0f}\n"
+        msg += f"🎉 Save ₹{float(upsell.discount_amount):.0f} • {discount_pct:.0f}% OFF\n"
 
-            keyboard_buttons.append([
-                InlineKeyboardButton(
-                    text=f"✅ Accept - {channel.name}",
-                    callback_data=f"upsell_accept_{upsell.id}"
-                )
-            ])
+        if upsell.is_manual:
+            msg += f"🎁 *Special admin offer!*\n"
 
         keyboard_buttons.append([
-            InlineKeyboardButton(text="🏠 Back to Home", callback_data="menu_back_home")
+            InlineKeyboardButton(
+                text=f"✅ Accept - {channel.name}",
+                callback_data=f"upsell_accept_{upsell.id}"
+            )
         ])
 
-        await message.answer(
-            msg,
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-        )
+    keyboard_buttons.append([
+        InlineKeyboardButton(text="🏠 Back to Home", callback_data="menu_back_home")
+    ])
+
+    await message.answer(
+        msg,
+        parse_mode="Markdown",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+    )
 
 
 # =====================================================
@@ -267,13 +257,13 @@ async def help_command(message: Message):
 # =====================================================
 
 @router.callback_query(F.data == "menu_membership")
-async def on_menu_membership(callback: CallbackQuery):
+async def on_menu_membership(callback: CallbackQuery, session: AsyncSession, db_user: UserSnapshot | None):
     from backend.app.bot.handlers.channel_plans import send_channel_list
     try:
         await callback.answer()
     except Exception:
         pass
-    await send_channel_list(callback.message, callback.from_user.id, edit=True)
+    await send_channel_list(callback.message, session, db_user, edit=True)
 
 
 # =====================================================
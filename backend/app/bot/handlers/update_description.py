@@ -96,6 +96,8 @@ async def update():
                 {"desc": desc, "id": channel_id}
             )
             print(f"✅ Updated channel {channel_id}")
+        # Running bot processes reload their channel catalog on commit
+        await conn.execute(text("NOTIFY channel_catalog"))
     await engine.dispose()
     print("✅ All descriptions updated successfully!")
 
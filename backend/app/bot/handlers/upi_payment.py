@@ -9,10 +9,13 @@ from aiogram.types import (
     InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
 )
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.app.db.session import async_session
 from backend.app.db.models import UpiPayment, User, Membership, Payment, Channel
 from backend.app.services.payment_service import UPI_ID, UPI_QR_PATH
+from backend.app.services.reminder_outbox import schedule_reminders
+from backend.app.services.user_cache import UserSnapshot, user_cache
+from backend.app.services.tier_engine import LIFETIME_DAYS, refresh_lifetime_count
 
 router = Router()
 
@@ -138,7 +141,7 @@ async def upi_paid_clicked(callback: CallbackQuery, state: FSMContext):
 # ── User: sends UTR text or screenshot ───────────────────────────────
 
 @router.message(UpiStates.waiting_for_proof)
-async def receive_proof(message: Message, state: FSMContext):
+async def receive_proof(message: Message, state: FSMContext, session: AsyncSession, db_user: UserSnapshot | None):
     data = await state.get_data()
     channel_id = data.get("upi_channel_id")
     days = data.get("upi_days")
@@ -170,50 +173,46 @@ async def receive_proof(message: Message, state: FSMContext):
         )
         return
 
-    async with async_session() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
-        user = result.scalar_one_or_none()
-        if not user:
-            await message.answer("User not found. Please /start first.")
-            await state.clear()
-            return
-
-        channel = await session.get(Channel, channel_id)
-
-        upi_payment = UpiPayment(
-            user_id=user.id,
-            channel_id=channel_id,
-            amount=price,
-            validity_days=days,
-            proof_type=proof_type,
-            utr_number=utr_number,
-            screenshot_file_id=screenshot_file_id,
-            status="pending"
-        )
-        session.add(upi_payment)
-        await session.commit()
-        await session.refresh(upi_payment)
+    user = db_user
+    if not user:
+        await message.answer("User not found. Please /start first.")
+        await state.clear()
+        return
 
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🏠 Back to Home", callback_data="cancel_to_home")]
-        ])
+    channel = await session.get(Channel, channel_id)
+
+    upi_payment = UpiPayment(
+        user_id=user.id,
+        channel_id=channel_id,
+        amount=price,
+        validity_days=days,
+        proof_type=proof_type,
+        utr_number=utr_number,
+        screenshot_file_id=screenshot_file_id,
+        status="pending"
+    )
+    session.add(upi_payment)
+    await session.commit()
+    await session.refresh(upi_payment)
 
-        await message.answer(
-            "\u23f3 *Payment Under Review*\n\n"
-            "Thanks\\! Your payment proof has been received \u2705\n\n"
-            "\U0001f50d Our team is verifying your payment\n"
-            "\u23f1 This usually takes *a few minutes*\n\n"
-            "\U0001f4de Need help? Contact admin: @doroide47\n\n"
-            "\U0001f3af You will get access immediately after approval\\.\n"
-            "\U0001f64f Please wait\\.\\.\\.",
-            parse_mode="MarkdownV2",
-            reply_markup=keyboard
-        )
-        await state.clear()
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🏠 Back to Home", callback_data="cancel_to_home")]
+    ])
 
-        await _notify_admin(upi_payment, user, channel, message.from_user)
+    await message.answer(
+        "\u23f3 *Payment Under Review*\n\n"
+        "Thanks\\! Your payment proof has been received \u2705\n\n"
+        "\U0001f50d Our team is verifying your payment\n"
+        "\u23f1 This usually takes *a few minutes*\n\n"
+        "\U0001f4de Need help? Contact admin: @doroide47\n\n"
+        "\U0001f3af You will get access immediately after approval\\.\n"
+        "\U0001f64f Please wait\\.\\.\\.",
+        parse_mode="MarkdownV2",
+        reply_markup=keyboard
+    )
+    await state.clear()
+
+    await _notify_admin(upi_payment, user, channel, message.from_user)
 
 
 # ── User: cancel and go back home ────────────────────────────────────
@@ -282,144 +281,152 @@ async def _notify_admin(upi_payment: UpiPayment, user: User, channel: Channel, t
 # ── Admin: Approve ────────────────────────────────────────────────────
 
 @router.callback_query(F.data.startswith("upi_approve:"))
-async def approve_payment(callback: CallbackQuery):
+async def approve_payment(callback: CallbackQuery, session: AsyncSession):
     from backend.bot.bot import bot
 
     payment_id = int(callback.data.split(":")[1])
 
-    async with async_session() as session:
-        upi_payment = await session.get(UpiPayment, payment_id)
-        if not upi_payment:
-            await callback.answer("Payment not found!", show_alert=True)
-            return
-        if upi_payment.status != "pending":
-            await callback.answer(f"Already {upi_payment.status}!", show_alert=True)
-            return
+    upi_payment = await session.get(UpiPayment, payment_id)
+    if not upi_payment:
+        await callback.answer("Payment not found!", show_alert=True)
+        return
+    if upi_payment.status != "pending":
+        await callback.answer(f"Already {upi_payment.status}!", show_alert=True)
+        return
 
-        upi_payment.status = "approved"
+    upi_payment.status = "approved"
 
-        user = await session.get(User, upi_payment.user_id)
-        channel = await session.get(Channel, upi_payment.channel_id)
+    user = await session.get(User, upi_payment.user_id)
+    channel = await session.get(Channel, upi_payment.channel_id)
 
-        now = datetime.utcnow()
-        expiry = now + timedelta(days=36500 if upi_payment.validity_days == 730 else upi_payment.validity_days)
+    now = datetime.utcnow()
+    expiry = now + timedelta(days=36500 if upi_payment.validity_days == 730 else upi_payment.validity_days)
 
-        result = await session.execute(
-            select(Membership).where(
-                Membership.user_id == upi_payment.user_id,
-                Membership.channel_id == upi_payment.channel_id,
-                Membership.is_active == True
-            )
+    result = await session.execute(
+        select(Membership).where(
+            Membership.user_id == upi_payment.user_id,
+            Membership.channel_id == upi_payment.channel_id,
+            Membership.is_active == True
         )
-        existing = result.scalar_one_or_none()
-
-        if existing:
-            existing.expiry_date = expiry
-            existing.validity_days = upi_payment.validity_days
-            existing.amount_paid = upi_payment.amount
-            existing.start_date = now
-            existing.reminded_7d = False
-            existing.reminded_1d = False
-            existing.reminded_expired = False
-        else:
-            session.add(Membership(
-                user_id=upi_payment.user_id,
-                channel_id=upi_payment.channel_id,
-                validity_days=upi_payment.validity_days,
-                amount_paid=upi_payment.amount,
-                start_date=now,
-                expiry_date=expiry,
-                is_active=True
-            ))
-
-        session.add(Payment(
+        .with_for_update()
+    )
+    existing = result.scalar_one_or_none()
+
+    replaced_days = existing.validity_days if existing else None
+    if existing:
+        existing.expiry_date = expiry
+        existing.validity_days = upi_payment.validity_days
+        existing.amount_paid = upi_payment.amount
+        existing.start_date = now
+        existing.reminded_7d = False
+        existing.reminded_1d = False
+        existing.reminded_expired = False
+        existing.kicked_at = None
+        existing.notified_at = None
+        membership = existing
+    else:
+        membership = Membership(
             user_id=upi_payment.user_id,
             channel_id=upi_payment.channel_id,
-            amount=upi_payment.amount,
-            payment_id=f"UPI_{upi_payment.id}",
-            status="captured"
-        ))
-
-        if upi_payment.amount > float(user.highest_amount_paid or 0):
-            user.highest_amount_paid = upi_payment.amount
-
-        await session.commit()
+            validity_days=upi_payment.validity_days,
+            amount_paid=upi_payment.amount,
+            start_date=now,
+            expiry_date=expiry,
+            is_active=True
+        )
+        session.add(membership)
+    await schedule_reminders(session, membership)
+
+    session.add(Payment(
+        user_id=upi_payment.user_id,
+        channel_id=upi_payment.channel_id,
+        amount=upi_payment.amount,
+        payment_id=f"UPI_{upi_payment.id}",
+        status="captured"
+    ))
+
+    if upi_payment.amount > float(user.highest_amount_paid or 0):
+        user.highest_amount_paid = upi_payment.amount
+
+    await session.commit()
+    user_cache.invalidate(user.telegram_id)
+    if LIFETIME_DAYS in (upi_payment.validity_days, replaced_days):
+        await refresh_lifetime_count(session, user.id)
+
+    invite_link = None
+    try:
+        invite = await bot.create_chat_invite_link(
+            chat_id=channel.telegram_chat_id,
+            member_limit=1,
+            expire_date=int((datetime.utcnow() + timedelta(hours=24)).timestamp())
+        )
+        invite_link = invite.invite_link
+    except Exception as e:
+        print(f"[UPI] Invite link error: {e}")
 
-        invite_link = None
-        try:
-            invite = await bot.create_chat_invite_link(
-                chat_id=channel.telegram_chat_id,
-                member_limit=1,
-                expire_date=int((datetime.utcnow() + timedelta(hours=24)).timestamp())
-            )
-            invite_link = invite.invite_link
-        except Exception as e:
-            print(f"[UPI] Invite link error: {e}")
+    user_msg = (
+        f"✅ *Payment Approved!*\n\n"
+        f"Channel: *{channel.name}*\n"
+        f"Plan: *{validity_label(upi_payment.validity_days)}*\n"
+        f"Amount: *\u20b9{upi_payment.amount}*\n\n"
+    )
+    if invite_link:
+        user_msg += f"\U0001f517 *Your Invite Link:*\n{invite_link}\n\n_Link expires in 24 hours._"
+    else:
+        user_msg += "_Your membership is active! Join the channel if you haven't already._"
 
-        user_msg = (
-            f"✅ *Payment Approved!*\n\n"
-            f"Channel: *{channel.name}*\n"
-            f"Plan: *{validity_label(upi_payment.validity_days)}*\n"
-            f"Amount: *\u20b9{upi_payment.amount}*\n\n"
+    try:
+        await bot.send_message(
+            chat_id=user.telegram_id,
+            text=user_msg,
+            parse_mode="Markdown"
         )
-        if invite_link:
-            user_msg += f"\U0001f517 *Your Invite Link:*\n{invite_link}\n\n_Link expires in 24 hours._"
-        else:
-            user_msg += "_Your membership is active! Join the channel if you haven't already._"
-
-        try:
-            await bot.send_message(
-                chat_id=user.telegram_id,
-                text=user_msg,
-                parse_mode="Markdown"
-            )
-        except Exception as e:
-            print(f"[UPI] User notify failed: {e}")
+    except Exception as e:
+        print(f"[UPI] User notify failed: {e}")
 
-        admin_label = f"@{callback.from_user.username}" if callback.from_user.username else "Admin"
-        await _edit_admin_msg(callback, f"\n\n✅ *APPROVED* by {admin_label}")
-        await callback.answer("✅ Approved!")
+    admin_label = f"@{callback.from_user.username}" if callback.from_user.username else "Admin"
+    await _edit_admin_msg(callback, f"\n\n✅ *APPROVED* by {admin_label}")
+    await callback.answer("✅ Approved!")
 
 
 # ── Admin: Reject ─────────────────────────────────────────────────────
 
 @router.callback_query(F.data.startswith("upi_reject:"))
-async def reject_payment(callback: CallbackQuery):
+async def reject_payment(callback: CallbackQuery, session: AsyncSession):
     from backend.bot.bot import bot
 
     payment_id = int(callback.data.split(":")[1])
 
-    async with async_session() as session:
-        upi_payment = await session.get(UpiPayment, payment_id)
-        if not upi_payment:
-            await callback.answer("Payment not found!", show_alert=True)
-            return
-        if upi_payment.status != "pending":
-            await callback.answer(f"Already {upi_payment.status}!", show_alert=True)
-            return
+    upi_payment = await session.get(UpiPayment, payment_id)
+    if not upi_payment:
+        await callback.answer("Payment not found!", show_alert=True)
+        return
+    if upi_payment.status != "pending":
+        await callback.answer(f"Already {upi_payment.status}!", show_alert=True)
+        return
 
-        upi_payment.status = "rejected"
-        await session.commit()
+    upi_payment.status = "rejected"
+    await session.commit()
 
-        user = await session.get(User, upi_payment.user_id)
+    user = await session.get(User, upi_payment.user_id)
 
-        try:
-            await bot.send_message(
-                chat_id=user.telegram_id,
-                text=(
-                    "❌ *Payment Rejected*\n\n"
-                    "We couldn't verify your payment proof.\n\n"
-                    "Please try again with a *clear screenshot*.\n"
-                    "🔥 For any issue, contact admin: @doroide47"
-                ),
-                parse_mode="Markdown"
-            )
-        except Exception as e:
-            print(f"[UPI] User reject notify failed: {e}")
+    try:
+        await bot.send_message(
+            chat_id=user.telegram_id,
+            text=(
+                "❌ *Payment Rejected*\n\n"
+                "We couldn't verify your payment proof.\n\n"
+                "Please try again with a *clear screenshot*.\n"
+                "🔥 For any issue, contact admin: @doroide47"
+            ),
+            parse_mode="Markdown"
+        )
+    except Exception as e:
+        print(f"[UPI] User reject notify failed: {e}")
 
-        admin_label = f"@{callback.from_user.username}" if callback.from_user.username else "Admin"
-        await _edit_admin_msg(callback, f"\n\n❌ *REJECTED* by {admin_label}")
-        await callback.answer("❌ Rejected.")
+    admin_label = f"@{callback.from_user.username}" if callback.from_user.username else "Admin"
+    await _edit_admin_msg(callback, f"\n\n❌ *REJECTED* by {admin_label}")
+    await callback.answer("❌ Rejected.")
 
 
 # ── Helper: edit admin message after action ───────────────────────────
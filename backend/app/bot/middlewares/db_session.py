@@ -0,0 +1,43 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from backend.app.db.session import async_session
+from backend.app.services.user_cache import user_cache
+
+# =========================================================
+# ONE DB SESSION PER UPDATE
+#
+# Outer middleware on dp.update: opens a single session for
+# the whole update and resolves the calling user once, so
+# handlers don't each open their own session and re-run
+# select(User).where(User.telegram_id == ...).
+#
+# db_user is a read-only UserSnapshot from user_cache (no
+# query on a hit); the session only checks out a connection
+# if the handler actually runs a query.
+#
+# Handlers opt in by naming the arguments:
+#     async def handler(message: Message, session, db_user): ...
+#
+# db_user is None for users who haven't sent /start yet.
+# The session is closed (and anything uncommitted rolled
+# back) when the update is done — handlers still commit
+# their own writes.
+# =========================================================
+
+
+class DbSessionMiddleware(BaseMiddleware):
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        async with async_session() as session:
+            data["session"] = session
+            tg_user = data.get("event_from_user")
+            data["db_user"] = await user_cache.load(session, tg_user.id) if tg_user else None
+            return await handler(event, data)
@@ -0,0 +1,88 @@
+from sqlalchemy import text
+
+# =========================================================
+# SCHEMA MIGRATIONS
+#
+# create_all() only creates missing tables. Columns and
+# indexes added to existing tables are listed here as
+# numbered migrations; apply_migrations() runs create_all()
+# and then the ones not yet recorded in schema_migrations,
+# in order, on startup.
+#
+# Rules:
+#   - never edit or renumber a migration that has shipped,
+#     append a new one
+#   - keep statements idempotent (IF NOT EXISTS) so a fresh
+#     database, where create_all() already built everything
+#     from the models, passes through cleanly
+#   - indexes are also declared on the models
+# =========================================================
+
+MIGRATION_LOCK_KEY = 7243002
+
+MIGRATIONS = [
+    (1, "blocked users", [
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS is_blocked BOOLEAN NOT NULL DEFAULT FALSE",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS blocked_at TIMESTAMPTZ",
+    ]),
+    (2, "expiry check index", [
+        "CREATE INDEX IF NOT EXISTS ix_memberships_active_expiry ON memberships (expiry_date) WHERE is_active",
+    ]),
+    (3, "expiry progress columns", [
+        "ALTER TABLE memberships ADD COLUMN IF NOT EXISTS kicked_at TIMESTAMPTZ",
+        "ALTER TABLE memberships ADD COLUMN IF NOT EXISTS notified_at TIMESTAMPTZ",
+    ]),
+    (4, "reminder window index", [
+        "CREATE INDEX IF NOT EXISTS ix_memberships_expiry_date ON memberships (expiry_date)",
+    ]),
+    (5, "hot path indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_memberships_user_channel ON memberships (user_id, channel_id)",
+        "CREATE INDEX IF NOT EXISTS ix_memberships_channel_active ON memberships (channel_id) WHERE is_active",
+        "CREATE INDEX IF NOT EXISTS ix_memberships_created_at ON memberships (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_memberships_razorpay_subscription_id "
+        "ON memberships (razorpay_subscription_id) WHERE razorpay_subscription_id IS NOT NULL",
+        "CREATE INDEX IF NOT EXISTS ix_payments_status_created ON payments (status, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_payments_user_id ON payments (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_upsell_attempts_user_channel_days "
+        "ON upsell_attempts (user_id, channel_id, from_validity_days)",
+    ]),
+    (6, "reminder outbox expiry snapshot", [
+        "ALTER TABLE reminder_outbox ADD COLUMN IF NOT EXISTS expiry_date TIMESTAMPTZ",
+        # Rows never retried still have their original due_at
+        "UPDATE reminder_outbox SET expiry_date = due_at + CASE kind"
+        " WHEN '7d' THEN INTERVAL '7 days'"
+        " WHEN '1d' THEN INTERVAL '1 day'"
+        " WHEN 'expiry_day' THEN INTERVAL '6 hours'"
+        " ELSE INTERVAL '-4 hours' END"
+        " WHERE expiry_date IS NULL AND (attempts = 0 OR (status = 'sent' AND attempts = 1))",
+    ]),
+]
+
+
+async def apply_migrations(conn, metadata):
+    """Create missing tables and apply pending migrations inside the caller's transaction."""
+    # Several workers may start at once — one creates tables and
+    # migrates, the rest wait and then find nothing to do
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    await conn.run_sync(metadata.create_all)
+
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY,"
+        " name VARCHAR(200) NOT NULL,"
+        " applied_at TIMESTAMPTZ NOT NULL DEFAULT now()"
+        ")"
+    ))
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    applied = {row[0] for row in result}
+
+    for version, name, statements in MIGRATIONS:
+        if version in applied:
+            continue
+        for statement in statements:
+            await conn.execute(text(statement))
+        await conn.execute(
+            text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+            {"version": version, "name": name}
+        )
+        print(f"✅ Applied migration {version:03d} ({name})")
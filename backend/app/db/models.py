@@ -8,7 +8,11 @@ from sqlalchemy import (
     Numeric,
     ForeignKey,
     func,
-    Text
+    Text,
+    JSON,
+    UniqueConstraint,
+    Index,
+    text
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -33,6 +37,10 @@ class User(Base):
     channel_1_tier = Column(Integer)
     highest_amount_paid = Column(Numeric(10, 2), default=0)
 
+    # Set when Telegram answers 403 (bot blocked / account deleted)
+    is_blocked = Column(Boolean, default=False, nullable=False)
+    blocked_at = Column(DateTime(timezone=True), nullable=True)
+
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
     memberships = relationship("Membership", back_populates="user")
@@ -71,7 +79,7 @@ class Membership(Base):
     amount_paid = Column(Numeric(10, 2), nullable=False)
 
     start_date = Column(DateTime(timezone=True), nullable=False)
-    expiry_date = Column(DateTime(timezone=True), nullable=False)
+    expiry_date = Column(DateTime(timezone=True), nullable=False, index=True)
 
     is_active = Column(Boolean, default=True)
 
@@ -84,14 +92,39 @@ class Membership(Base):
     reminded_1d = Column(Boolean, default=False)
     reminded_expired = Column(Boolean, default=False)
 
+    # Expiry progress — cleared again whenever the membership is renewed
+    kicked_at = Column(DateTime(timezone=True), nullable=True)
+    notified_at = Column(DateTime(timezone=True), nullable=True)
+
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
     user = relationship("User", back_populates="memberships")
     channel = relationship("Channel", back_populates="memberships")
 
+    __table_args__ = (
+        # Hourly expiry check: active rows ordered by expiry_date
+        Index("ix_memberships_active_expiry", "expiry_date", postgresql_where=text("is_active")),
+        # "This user's memberships" / "this user's membership in this channel"
+        Index("ix_memberships_user_channel", "user_id", "channel_id"),
+        # Channel audiences and member counts
+        Index("ix_memberships_channel_active", "channel_id", postgresql_where=text("is_active")),
+        # Reports and upsell windows
+        Index("ix_memberships_created_at", "created_at"),
+        # Razorpay subscription webhooks
+        Index(
+            "ix_memberships_razorpay_subscription_id", "razorpay_subscription_id",
+            postgresql_where=text("razorpay_subscription_id IS NOT NULL")
+        ),
+    )
+
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        # Revenue / failure reports: status + created_at range
+        Index("ix_payments_status_created", "status", "created_at"),
+        Index("ix_payments_user_id", "user_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -110,6 +143,10 @@ class Payment(Base):
 
 class UpsellAttempt(Base):
     __tablename__ = "upsell_attempts"
+    __table_args__ = (
+        # "Already offered?" check in the upsell sender
+        Index("ix_upsell_attempts_user_channel_days", "user_id", "channel_id", "from_validity_days"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -150,4 +187,83 @@ class UpiPayment(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", backref="upi_payments")
-    channel = relationship("Channel", backref="upi_payments")
\ No newline at end of file
+    channel = relationship("Channel", backref="upi_payments")
+
+
+class ProcessedUpdate(Base):
+    __tablename__ = "processed_updates"
+
+    # Telegram update_id — used to drop redelivered webhook updates
+    update_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
+
+
+class BroadcastJob(Base):
+    __tablename__ = "broadcast_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    audience = Column(String(20), nullable=False)        # all / specific / channel
+    channel_id = Column(Integer, ForeignKey("channels.id"), nullable=True)
+    target_ids = Column(JSON, nullable=True)             # specific audience only
+
+    text = Column(Text, nullable=True)
+    photo_id = Column(String(255), nullable=True)
+    caption = Column(Text, nullable=True)
+
+    status = Column(String(20), default="running", nullable=False)  # running / paused / cancelled / completed
+    cursor = Column(BigInteger, default=0, nullable=False)          # last telegram_id handled
+
+    total = Column(Integer, default=0, nullable=False)
+    sent = Column(Integer, default=0, nullable=False)
+    blocked = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+
+    created_by = Column(BigInteger, nullable=True)
+    progress_chat_id = Column(BigInteger, nullable=True)
+    progress_message_id = Column(Integer, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class BroadcastDelivery(Base):
+    __tablename__ = "broadcast_deliveries"
+    __table_args__ = (
+        UniqueConstraint("job_id", "telegram_id", name="uq_broadcast_delivery_job_user"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("broadcast_jobs.id"), nullable=False)
+    telegram_id = Column(BigInteger, nullable=False)
+    status = Column(String(20), nullable=False)          # sent / blocked / failed
+
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+class ReminderOutbox(Base):
+    __tablename__ = "reminder_outbox"
+    __table_args__ = (
+        # Poller: pending rows in due order
+        Index("ix_reminder_outbox_pending_due", "due_at", postgresql_where=text("status = 'pending'")),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    membership_id = Column(Integer, ForeignKey("memberships.id"), nullable=False, index=True)
+    kind = Column(String(20), nullable=False)            # 7d / 1d / expiry_day / post_expiry
+    expiry_date = Column(DateTime(timezone=True), nullable=True)  # membership expiry the row was scheduled for
+    due_at = Column(DateTime(timezone=True), nullable=False)
+    status = Column(String(20), default="pending", nullable=False)  # pending / sent / skipped / failed
+    attempts = Column(Integer, default=0, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class JobWatermark(Base):
+    __tablename__ = "job_watermarks"
+
+    name = Column(String(100), primary_key=True)         # job id, e.g. "upsell_offers"
+    value = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,68 @@
+import time
+from collections import deque
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# =========================================================
+# INSTRUMENTED CONNECTION POOL
+#
+# The engine's default asyncpg pool, timing every checkout
+# (_do_get) so pool pressure is visible at /metrics/db:
+# how long callers wait for a connection, how often they
+# time out, and how many connections are out right now.
+#
+# Metrics live on a module-level object because the engine
+# swaps in a fresh pool instance on dispose()/recreate().
+# =========================================================
+
+RECENT_WAITS = 1000
+
+
+class PoolMetrics:
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_waits = deque(maxlen=RECENT_WAITS)
+
+    def record(self, wait: float):
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent_waits.append(wait)
+
+    def stats(self, pool) -> dict:
+        recent = sorted(self.recent_waits)
+        p95 = recent[int(len(recent) * 0.95) - 1] if recent else 0.0
+        return {
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout_s": pool.timeout(),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+            "p95_wait_ms": round(p95 * 1000, 2),
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        pool_metrics.record(time.perf_counter() - started)
+        return connection
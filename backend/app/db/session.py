@@ -1,13 +1,42 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 import os
+
+from backend.app.db.pool import InstrumentedPool
+
 # Get database URL from environment variable
 DATABASE_URL = os.getenv("DATABASE_URL")
 # Convert postgresql:// to postgresql+asyncpg:// for async support
 if DATABASE_URL and DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+# Sync (psycopg2) URL for code without asyncio support, e.g. the APScheduler job store
+SYNC_DATABASE_URL = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql+psycopg2://", 1) if DATABASE_URL else None
+
+# Pool sizing — one pool per process, so the worst case is
+# (DB_POOL_SIZE + DB_MAX_OVERFLOW) x processes connections.
+# DB_STATEMENT_CACHE_SIZE sets asyncpg's prepared statement caches
+# (0 behind pgbouncer in transaction mode).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
 # Create async SQLAlchemy engine
-engine = create_async_engine(DATABASE_URL, echo=False, pool_pre_ping=True)
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    pool_pre_ping=True,
+    poolclass=InstrumentedPool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    connect_args={
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+    },
+)
 # Create async session maker
 async_session = async_sessionmaker(
     engine, 
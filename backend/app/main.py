@@ -1,8 +1,6 @@
 import os
 from fastapi import FastAPI, Request
-from fastapi.responses import RedirectResponse
-from aiogram.types import Update
-import asyncio
+from fastapi.responses import RedirectResponse, JSONResponse
 
 app = FastAPI()
 
@@ -10,12 +8,14 @@ app = FastAPI()
 # BOT + DISPATCHER
 # ======================================================
 from backend.bot.bot import bot, dp
+from backend.app.services.update_queue import update_queue
+from backend.app.services.update_dedup import update_dedup
+from backend.app.services.update_decoder import decode_update
 
 
 # ======================================================
 # IMPORT HANDLERS
 # ======================================================
-from backend.app.tasks.upsell_sender import scheduled_upsell_task
 from backend.app.tasks.reminder_worker import run_reminder_check
 from backend.app.bot.handlers.start import router as start_router
 from backend.app.bot.handlers.renew import router as renew_router
@@ -37,6 +37,8 @@ from backend.app.bot.handlers.daily_report_handler import router as daily_report
 from backend.app.bot.handlers.members_handler import router as members_router
 from backend.app.db.base import Base
 from backend.app.db.session import engine
+from backend.app.db.migrations import apply_migrations
+from backend.app.services.channel_catalog import channel_catalog
 
 # ======================================================
 # REGISTER ROUTERS
@@ -73,15 +75,31 @@ app.include_router(razorpay_router, prefix="/api")
 
 from backend.app.api.webhook import router as razorpay_router
 app.include_router(razorpay_router, prefix="/api")
+
+# ======================================================
+# METRICS
+# ======================================================
+from backend.app.api.metrics import router as metrics_router
+app.include_router(metrics_router)
+
 # ======================================================
 # TELEGRAM WEBHOOK
 # ======================================================
 @app.post("/telegram/webhook")
 async def telegram_webhook(request: Request):
-    data = await request.json()
+    body = await request.body()
     print("🔥 Telegram update received")
-    update = Update.model_validate(data)
-    await dp.feed_update(bot, update)
+    update = decode_update(body)
+
+    # Redelivered update — already queued or handled
+    if await update_dedup.is_duplicate(update.update_id):
+        return {"ok": True}
+
+    # Handlers run on the update queue workers; ack immediately
+    if not update_queue.submit(update):
+        print(f"⚠️ Update queue full, rejecting update {update.update_id}")
+        await update_dedup.forget(update.update_id)
+        return JSONResponse(status_code=503, content={"ok": False})
     return {"ok": True}
 
 # ======================================================
@@ -90,11 +108,18 @@ async def telegram_webhook(request: Request):
 @app.on_event("startup")
 async def on_startup():
     print("🚀 App starting...")
+
+    # ✅ START UPDATE WORKERS
+    update_queue.start()
     
     # ✅ CREATE TABLES
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await apply_migrations(conn, Base.metadata)
     print("✅ Database tables created")
+
+    # ✅ LOAD CHANNEL CATALOG (+ listen for changes from other processes)
+    await channel_catalog.load()
+    channel_catalog.start()
     
     # ✅ SET WEBHOOK
     webhook_url = os.getenv("TELEGRAM_WEBHOOK_URL")
@@ -107,22 +132,24 @@ async def on_startup():
     await set_bot_commands(bot)
     print("✅ Bot menu commands set")
     
-    # ✅ START BACKGROUND WORKERS
-    from backend.app.tasks.scheduler import start_scheduler
-    start_scheduler()
+    # ✅ START BACKGROUND WORKERS (scheduler runs on the elected leader only)
+    from backend.app.tasks.scheduler import scheduler_leader
+    scheduler_leader.start()
     print("✅ Background workers started")
     
-    # ✅ START UPSELL SENDER
-    asyncio.create_task(scheduled_upsell_task())
-    print("✅ Upsell sender task started")
+    # ✅ RESUME INTERRUPTED BROADCASTS
+    from backend.app.services.broadcast_engine import resume_broadcasts
+    await resume_broadcasts()
 
 # ======================================================
 # SHUTDOWN
 # ======================================================
 @app.on_event("shutdown")
 async def on_shutdown():
-    from backend.app.tasks.scheduler import stop_scheduler
-    stop_scheduler()
+    from backend.app.tasks.scheduler import scheduler_leader
+    await scheduler_leader.stop()
+    await channel_catalog.stop()
+    await update_queue.stop()
     print("👋 App shutting down...")
 
 # ======================================================
@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import update
+
+from backend.app.db.session import async_session
+from backend.app.db.models import User
+from backend.app.services.user_cache import user_cache
+
+# =========================================================
+# BLOCKED USERS
+#
+# Users who blocked the bot (or deleted their account) make
+# every send fail with TelegramForbiddenError. The sender
+# layer records them here so broadcasts, reminders, upsells
+# and expiry notices can skip them; /start clears the flag.
+# =========================================================
+
+
+async def mark_blocked(telegram_id: int):
+    async with async_session() as session:
+        await session.execute(
+            update(User)
+            .where(User.telegram_id == telegram_id, User.is_blocked == False)
+            .values(is_blocked=True, blocked_at=datetime.now(timezone.utc))
+        )
+        await session.commit()
+    user_cache.invalidate(telegram_id)
+
+
+def clear_blocked(user: User):
+    """Reset the flag on a loaded user; caller commits."""
+    if user.is_blocked:
+        user.is_blocked = False
+        user.blocked_at = None
@@ -0,0 +1,418 @@
+import asyncio
+import os
+import time
+from contextlib import aclosing
+from functools import partial
+from datetime import datetime, timezone
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from sqlalchemy import select, update, func, text
+from sqlalchemy.dialects.postgresql import insert
+
+from backend.app.db.session import engine, async_session
+from backend.app.services.concurrency import run_bounded
+from backend.app.db.models import User, Membership, BroadcastJob, BroadcastDelivery
+from backend.bot.bot import bot
+
+# =========================================================
+# BROADCAST ENGINE
+#
+# Broadcasts are persisted jobs (broadcast_jobs). Recipients
+# are paged from the database in telegram_id order, one short
+# keyset query per batch (telegram_id > cursor LIMIT n), so
+# memory stays flat whatever the audience size and no
+# connection is held between batches. Each batch is sent by a
+# bounded pool of senders under the shared Telegram rate
+# limiter, then its deliveries, counters and cursor are
+# committed together. A restart resumes from the cursor and
+# re-sends at most one uncommitted batch.
+#
+# Admins can pause, resume and cancel from the progress
+# message; the runner checks the job status between batches.
+#
+# Any process may start or resume a job, so a runner first
+# claims it with pg_try_advisory_lock(BROADCAST_LOCK_CLASS,
+# job_id) on a dedicated connection held for the whole run.
+# If another process already holds the claim the runner
+# exits without sending; if the claim connection drops the
+# runner stops and the job is picked up on the next resume.
+# =========================================================
+
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "25"))
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "100"))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "5"))
+BROADCAST_LOCK_CLASS = int(os.getenv("BROADCAST_LOCK_CLASS", "7243003"))
+
+_runners: dict = {}  # job_id -> running task
+
+
+# =========================================================
+# AUDIENCE
+# =========================================================
+
+def _audience_query(job: BroadcastJob):
+    if job.audience == "channel":
+        return (
+            select(User.telegram_id)
+            .join(Membership, Membership.user_id == User.id)
+            .where(
+                Membership.channel_id == job.channel_id,
+                Membership.is_active == True,
+                User.is_blocked == False
+            )
+            .distinct()
+        )
+    return select(User.telegram_id).where(User.is_blocked == False)
+
+
+async def _count_audience(session, job: BroadcastJob) -> int:
+    if job.audience == "specific":
+        return len(set(job.target_ids or []))
+    result = await session.execute(
+        select(func.count()).select_from(_audience_query(job).subquery())
+    )
+    return result.scalar() or 0
+
+
+async def _stream_audience(job: BroadcastJob):
+    """Yield recipient telegram_ids after the job cursor, one batch at a time."""
+    if job.audience == "specific":
+        ids = [i for i in sorted(set(job.target_ids or [])) if i > job.cursor]
+        for start in range(0, len(ids), BROADCAST_BATCH_SIZE):
+            yield ids[start:start + BROADCAST_BATCH_SIZE]
+        return
+
+    cursor = job.cursor
+    while True:
+        async with async_session() as session:
+            result = await session.execute(
+                _audience_query(job)
+                .where(User.telegram_id > cursor)
+                .order_by(User.telegram_id)
+                .limit(BROADCAST_BATCH_SIZE)
+            )
+            batch = result.scalars().all()
+        if not batch:
+            return
+        yield batch
+        cursor = batch[-1]
+
+
+# =========================================================
+# PUBLIC API
+# =========================================================
+
+async def create_broadcast(audience: str, text=None, photo_id=None, caption=None,
+                           channel_id=None, target_ids=None, created_by=None,
+                           progress_chat_id=None, progress_message_id=None) -> BroadcastJob:
+    """Persist a broadcast job and start sending in the background."""
+    async with async_session() as session:
+        job = BroadcastJob(
+            audience=audience,
+            channel_id=channel_id,
+            target_ids=target_ids,
+            text=text,
+            photo_id=photo_id,
+            caption=caption,
+            status="running",
+            cursor=0,
+            created_by=created_by,
+            progress_chat_id=progress_chat_id,
+            progress_message_id=progress_message_id,
+        )
+        job.total = await _count_audience(session, job)
+        session.add(job)
+        await session.commit()
+
+    _start_runner(job.id)
+    print(f"📢 Broadcast #{job.id} started for {job.total} recipient(s)")
+    return job
+
+
+async def pause_broadcast(job_id: int) -> bool:
+    return await _set_status(job_id, "paused", allowed_from=("running",))
+
+
+async def cancel_broadcast(job_id: int) -> bool:
+    ok = await _set_status(job_id, "cancelled", allowed_from=("running", "paused"))
+    if ok and job_id not in _runners:
+        await _edit_progress(job_id)
+    return ok
+
+
+async def resume_broadcast(job_id: int) -> bool:
+    ok = await _set_status(job_id, "running", allowed_from=("paused",))
+    if ok:
+        _start_runner(job_id)
+    return ok
+
+
+async def resume_broadcasts():
+    """Called on startup — pick up jobs that were running when the process stopped.
+
+    Every process calls this; jobs another process is already
+    running are skipped by the runner's claim.
+    """
+    async with async_session() as session:
+        result = await session.execute(
+            select(BroadcastJob.id).where(BroadcastJob.status == "running")
+        )
+        job_ids = [r[0] for r in result.fetchall()]
+
+    for job_id in job_ids:
+        _start_runner(job_id)
+    if job_ids:
+        print(f"📢 Resuming {len(job_ids)} broadcast job(s)")
+
+
+async def _set_status(job_id: int, status: str, allowed_from: tuple) -> bool:
+    values = {"status": status}
+    if status in ("cancelled", "completed"):
+        values["finished_at"] = datetime.now(timezone.utc)
+
+    async with async_session() as session:
+        result = await session.execute(
+            update(BroadcastJob)
+            .where(BroadcastJob.id == job_id, BroadcastJob.status.in_(allowed_from))
+            .values(**values)
+        )
+        await session.commit()
+    return result.rowcount > 0
+
+
+def _start_runner(job_id: int):
+    if job_id in _runners:
+        return
+    _runners[job_id] = asyncio.create_task(_run(job_id), name=f"broadcast-{job_id}")
+
+
+# =========================================================
+# JOB CLAIM
+# =========================================================
+
+async def _claim(job_id: int):
+    """Connection holding the job's advisory lock, or None if another runner has it."""
+    conn = await engine.connect()
+    try:
+        result = await conn.execute(
+            text("SELECT pg_try_advisory_lock(:cls, :job_id)"),
+            {"cls": BROADCAST_LOCK_CLASS, "job_id": job_id}
+        )
+        acquired = result.scalar()
+        await conn.commit()
+    except Exception:
+        await conn.close()
+        raise
+    if not acquired:
+        await conn.close()
+        return None
+    return conn
+
+
+async def _release(conn, job_id: int):
+    try:
+        await conn.execute(
+            text("SELECT pg_advisory_unlock(:cls, :job_id)"),
+            {"cls": BROADCAST_LOCK_CLASS, "job_id": job_id}
+        )
+        await conn.commit()
+        await conn.close()
+    except Exception:
+        # Dropping the connection releases the lock too
+        await conn.invalidate()
+        await conn.close()
+
+
+async def _claimed_status(conn, job_id: int) -> str | None:
+    # Runs on the claim connection, so a lost claim fails here
+    # before the next batch is sent
+    result = await conn.execute(
+        select(BroadcastJob.status).where(BroadcastJob.id == job_id)
+    )
+    status = result.scalar_one_or_none()
+    await conn.commit()
+    return status
+
+
+# =========================================================
+# JOB RUNNER
+# =========================================================
+
+async def _run(job_id: int):
+    started = time.monotonic()
+    last_edit = started
+    stopped = False
+
+    try:
+        claim = await _claim(job_id)
+    except Exception as e:
+        print(f"❌ Broadcast #{job_id} could not be claimed: {e}")
+        _runners.pop(job_id, None)
+        return
+    if claim is None:
+        print(f"📢 Broadcast #{job_id} is running in another process")
+        _runners.pop(job_id, None)
+        return
+
+    try:
+        # Loaded after the claim so the cursor is the latest committed one
+        async with async_session() as session:
+            job = await session.get(BroadcastJob, job_id)
+
+        if job is not None and job.status == "running":
+            async with aclosing(_stream_audience(job)) as batches:
+                async for batch in batches:
+                    if await _claimed_status(claim, job_id) != "running":
+                        stopped = True
+                        break
+
+                    results = await _send_batch(job, batch)
+                    await _save_batch(job_id, batch[-1], results)
+
+                    if time.monotonic() - last_edit >= BROADCAST_PROGRESS_INTERVAL:
+                        last_edit = time.monotonic()
+                        await _edit_progress(job_id)
+                else:
+                    await _set_status(job_id, "completed", allowed_from=("running",))
+
+    except Exception as e:
+        print(f"❌ Broadcast #{job_id} runner crashed: {e}")
+    finally:
+        await _release(claim, job_id)
+        _runners.pop(job_id, None)
+
+    # Resumed while we were stopping: the resume's own runner
+    # found the claim still held, so carry on from here
+    if stopped and await _job_status(job_id) == "running":
+        _start_runner(job_id)
+        return
+
+    job = await _edit_progress(job_id)
+    if job:
+        print(
+            f"✅ Broadcast #{job_id} {job.status} after {time.monotonic() - started:.0f}s — "
+            f"sent {job.sent}, blocked {job.blocked}, failed {job.failed}"
+        )
+
+
+async def _job_status(job_id: int) -> str | None:
+    async with async_session() as session:
+        result = await session.execute(
+            select(BroadcastJob.status).where(BroadcastJob.id == job_id)
+        )
+        return result.scalar_one_or_none()
+
+
+async def _send_batch(job: BroadcastJob, batch: list[int]) -> list[tuple[int, str]]:
+    return await run_bounded(batch, partial(_send_one, job), BROADCAST_CONCURRENCY)
+
+
+async def _send_one(job: BroadcastJob, tg_id: int) -> str:
+    try:
+        if job.photo_id:
+            await bot.send_photo(
+                chat_id=tg_id,
+                photo=job.photo_id,
+                caption=job.caption or "",
+                parse_mode="HTML"
+            )
+        else:
+            await bot.send_message(
+                chat_id=tg_id,
+                text=job.text or "",
+                parse_mode="HTML"
+            )
+        return "sent"
+    except TelegramForbiddenError:
+        return "blocked"
+    except Exception:
+        return "failed"
+
+
+async def _save_batch(job_id: int, cursor: int, results: list[tuple[int, str]]):
+    counts = {"sent": 0, "blocked": 0, "failed": 0}
+    for _, status in results:
+        counts[status] += 1
+
+    async with async_session() as session:
+        await session.execute(
+            insert(BroadcastDelivery)
+            .values([
+                {"job_id": job_id, "telegram_id": tg_id, "status": status}
+                for tg_id, status in results
+            ])
+            .on_conflict_do_nothing(index_elements=["job_id", "telegram_id"])
+        )
+        await session.execute(
+            update(BroadcastJob)
+            .where(BroadcastJob.id == job_id)
+            .values(
+                cursor=cursor,
+                sent=BroadcastJob.sent + counts["sent"],
+                blocked=BroadcastJob.blocked + counts["blocked"],
+                failed=BroadcastJob.failed + counts["failed"],
+            )
+        )
+        await session.commit()
+
+
+# =========================================================
+# PROGRESS MESSAGE
+# =========================================================
+
+def job_controls(job: BroadcastJob) -> InlineKeyboardMarkup:
+    if job.status == "running":
+        buttons = [[
+            InlineKeyboardButton(text="⏸ Pause", callback_data=f"bc_job_pause_{job.id}"),
+            InlineKeyboardButton(text="🛑 Cancel", callback_data=f"bc_job_cancel_{job.id}"),
+        ]]
+    elif job.status == "paused":
+        buttons = [[
+            InlineKeyboardButton(text="▶️ Resume", callback_data=f"bc_job_resume_{job.id}"),
+            InlineKeyboardButton(text="🛑 Cancel", callback_data=f"bc_job_cancel_{job.id}"),
+        ]]
+    else:
+        buttons = [[InlineKeyboardButton(text="🔙 Back to Admin Panel", callback_data="admin_back_main")]]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def job_progress_text(job: BroadcastJob) -> str:
+    done = job.sent + job.blocked + job.failed
+    pct = done * 100 // job.total if job.total else 100
+    titles = {
+        "running": f"📤 <b>Sending...</b> {done}/{job.total} ({pct}%)",
+        "paused": f"⏸ <b>Broadcast Paused</b> {done}/{job.total} ({pct}%)",
+        "cancelled": f"🛑 <b>Broadcast Cancelled</b> {done}/{job.total}",
+        "completed": "✅ <b>Broadcast Complete</b>",
+    }
+    return (
+        f"{titles.get(job.status, job.status)}\n\n"
+        f"📤 Sent: {job.sent}\n"
+        f"🚫 Blocked: {job.blocked}\n"
+        f"❌ Failed: {job.failed}\n"
+        f"📊 Total: {job.total}"
+    )
+
+
+async def _edit_progress(job_id: int) -> BroadcastJob | None:
+    async with async_session() as session:
+        job = await session.get(BroadcastJob, job_id)
+
+    if not job or not job.progress_chat_id or not job.progress_message_id:
+        return job
+
+    try:
+        await bot.edit_message_text(
+            text=job_progress_text(job),
+            chat_id=job.progress_chat_id,
+            message_id=job.progress_message_id,
+            reply_markup=job_controls(job),
+            parse_mode="HTML"
+        )
+    except TelegramBadRequest:
+        # "message is not modified" — nothing new since the last edit
+        pass
+    except Exception as e:
+        print(f"⚠️ Broadcast #{job_id} progress edit failed: {e}")
+    return job
@@ -0,0 +1,179 @@
+import asyncio
+import os
+from typing import NamedTuple
+
+from sqlalchemy import select, text
+
+from backend.app.db.session import engine, async_session
+from backend.app.db.models import Channel
+
+# =========================================================
+# CHANNEL CATALOG CACHE
+#
+# Channels change a few times a month but are read on almost
+# every interaction (channel lists, plan screens, admin
+# pickers). The catalog keeps every channel in memory as an
+# immutable ChannelSnapshot, loaded at startup, so those
+# reads cost no queries.
+#
+# Invalidation:
+#   - writers call notify_channels_changed(session) before
+#     they commit; Postgres delivers NOTIFY channel_catalog
+#     on commit to every process (this one included)
+#   - each process LISTENs on a dedicated connection and
+#     marks its catalog stale; the next read reloads it
+#   - if the listener connection drops, notifications may
+#     have been missed, so the catalog is marked stale too
+#
+# Snapshots are detached from any session — use them for
+# names, ids and flags, and session.get(Channel, id) when a
+# row must be modified.
+# =========================================================
+
+CHANNEL_CATALOG_NOTIFY = "channel_catalog"
+CHANNEL_CATALOG_HEARTBEAT = int(os.getenv("CHANNEL_CATALOG_HEARTBEAT", "60"))
+
+
+class ChannelSnapshot(NamedTuple):
+    id: int
+    name: str
+    telegram_chat_id: str
+    description: str | None
+    is_public: bool
+    is_active: bool
+
+
+async def notify_channels_changed(session):
+    """Queue the invalidation NOTIFY in the caller's transaction."""
+    await session.execute(text(f"NOTIFY {CHANNEL_CATALOG_NOTIFY}"))
+
+
+class ChannelCatalog:
+
+    def __init__(self, heartbeat: int = CHANNEL_CATALOG_HEARTBEAT):
+        self.heartbeat = heartbeat
+        self._by_id: dict[int, ChannelSnapshot] = {}
+        self._ordered: tuple[ChannelSnapshot, ...] = ()
+        self._stale = True
+        self._lock = asyncio.Lock()
+        self._conn = None
+        self._task = None
+        self.loads = 0
+
+    # ── reads ─────────────────────────────────────────────
+
+    async def get(self, channel_id: int) -> ChannelSnapshot | None:
+        await self._ensure_loaded()
+        return self._by_id.get(channel_id)
+
+    async def all(self) -> tuple[ChannelSnapshot, ...]:
+        await self._ensure_loaded()
+        return self._ordered
+
+    async def active(self) -> tuple[ChannelSnapshot, ...]:
+        await self._ensure_loaded()
+        return tuple(c for c in self._ordered if c.is_active)
+
+    async def visible_to(self, purchased_channel_ids) -> tuple[ChannelSnapshot, ...]:
+        """Active channels that are public or already bought by the user."""
+        await self._ensure_loaded()
+        purchased = set(purchased_channel_ids)
+        return tuple(
+            c for c in self._ordered
+            if c.is_active and (c.is_public or c.id in purchased)
+        )
+
+    # ── loading / invalidation ────────────────────────────
+
+    async def load(self):
+        # Cleared first: an invalidation arriving mid-load
+        # marks the result stale again instead of being lost
+        self._stale = False
+        try:
+            async with async_session() as session:
+                result = await session.execute(select(Channel).order_by(Channel.id))
+                channels = result.scalars().all()
+        except Exception:
+            self._stale = True
+            raise
+
+        ordered = tuple(
+            ChannelSnapshot(
+                id=c.id,
+                name=c.name,
+                telegram_chat_id=c.telegram_chat_id,
+                description=c.description,
+                is_public=bool(c.is_public),
+                is_active=bool(c.is_active),
+            )
+            for c in channels
+        )
+        self._by_id = {c.id: c for c in ordered}
+        self._ordered = ordered
+        self.loads += 1
+        print(f"📺 Channel catalog loaded ({len(ordered)} channels)")
+
+    async def _ensure_loaded(self):
+        if not self._stale:
+            return
+        async with self._lock:
+            if self._stale:
+                await self.load()
+
+    def invalidate(self):
+        self._stale = True
+
+    # ── cross-process listener ────────────────────────────
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="channel-catalog-listener")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._disconnect()
+
+    async def _run(self):
+        while True:
+            try:
+                if self._conn is None:
+                    await self._listen()
+                else:
+                    await self._conn.execute(text("SELECT 1"))
+                    await self._conn.commit()
+            except Exception as e:
+                print(f"⚠️ Channel catalog listener connection lost: {e}")
+                await self._disconnect()
+            await asyncio.sleep(self.heartbeat)
+
+    async def _listen(self):
+        conn = await engine.connect()
+        try:
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.add_listener(CHANNEL_CATALOG_NOTIFY, self._on_notify)
+        except Exception:
+            await conn.close()
+            raise
+        self._conn = conn
+        # Changes made while we weren't listening were missed
+        self.invalidate()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.invalidate()
+
+    async def _disconnect(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self.invalidate()
+            try:
+                # Don't hand a LISTENing connection back to the pool
+                await conn.invalidate()
+                await conn.close()
+            except Exception:
+                pass
+
+
+channel_catalog = ChannelCatalog()
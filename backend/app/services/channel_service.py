@@ -1,5 +1,6 @@
 from sqlalchemy import select
 from backend.app.db.models import Channel
+from backend.app.services.channel_catalog import channel_catalog, notify_channels_changed
 
 
 class ChannelService:
@@ -20,4 +21,6 @@ class ChannelService:
         channel = await session.get(Channel, channel_id)
         if channel:
             channel.is_active = False
+            await notify_channels_changed(session)
             await session.commit()
+            channel_catalog.invalidate()
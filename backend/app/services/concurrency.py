@@ -0,0 +1,36 @@
+import asyncio
+from typing import Awaitable, Callable, Iterable, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# =========================================================
+# BOUNDED WORKER POOL
+#
+# Bulk Telegram work (broadcast batches, expiry kicks and
+# notices, upsell offers) runs a fixed number of workers
+# pulling from one shared iterator, rather than one task per
+# item: at most `concurrency` calls are in flight, and the
+# shared rate limiter paces them.
+# =========================================================
+
+
+async def run_bounded(
+    items: Iterable[T],
+    handler: Callable[[T], Awaitable[R]],
+    concurrency: int,
+) -> list[tuple[T, R]]:
+    """Run handler over items, at most `concurrency` at a time.
+
+    Returns (item, result) pairs in completion order.
+    """
+    items = list(items)
+    pending = iter(items)
+    results: list[tuple[T, R]] = []
+
+    async def worker():
+        for item in pending:
+            results.append((item, await handler(item)))
+
+    await asyncio.gather(*(worker() for _ in range(min(max(1, concurrency), len(items)))))
+    return results
@@ -4,6 +4,7 @@ from decimal import Decimal
 from sqlalchemy import select
 
 from backend.app.db.models import Membership, User, Channel
+from backend.app.services.reminder_outbox import schedule_reminders
 from backend.bot.bot import bot
 
 
@@ -61,7 +62,7 @@ class MembershipService:
             select(Membership).where(
                 Membership.user_id == user_id,
                 Membership.is_active == True
-            )
+            ).with_for_update()
         )
 
         membership = result.scalar_one_or_none()
@@ -69,6 +70,11 @@ class MembershipService:
         if membership:
             base = max(membership.expiry_date, now)
             membership.expiry_date = base + timedelta(days=days)
+            membership.reminded_7d = False
+            membership.reminded_1d = False
+            membership.reminded_expired = False
+            membership.kicked_at = None
+            membership.notified_at = None
         else:
             membership = Membership(
                 user_id=user_id,
@@ -79,6 +85,7 @@ class MembershipService:
                 is_active=True
             )
             session.add(membership)
+        await schedule_reminders(session, membership)
 
         # ------------------------------
         # Send invite
@@ -2,6 +2,7 @@ import os
 import razorpay
 from sqlalchemy import select
 from backend.app.db.models import Channel, Payment
+from backend.app.services.channel_catalog import channel_catalog, notify_channels_changed
 
 def initialize_razorpay():
     try:
@@ -171,4 +172,6 @@ class ChannelService:
         channel = await session.get(Channel, channel_id)
         if channel:
             channel.is_active = False
-            await session.commit()
\ No newline at end of file
+            await notify_channels_changed(session)
+            await session.commit()
+            channel_catalog.invalidate()
\ No newline at end of file
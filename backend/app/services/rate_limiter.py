@@ -0,0 +1,147 @@
+import asyncio
+import os
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError
+
+from backend.app.services.blocked_users import mark_blocked
+
+# =========================================================
+# TELEGRAM API RATE LIMITER
+#
+# Installed once on the bot session (backend/bot/bot.py), so
+# every send — handlers, broadcasts, reminders, expiry,
+# upsells, reports — shares the same budget:
+#
+#   global       ~30 messages/s across all chats
+#   private chat ~1 message/s (small burst allowed)
+#   group/channel 20 messages/min
+#
+# Only message-producing methods are throttled. Every method
+# honours RetryAfter: the global bucket is paused for the
+# requested time and the call is retried.
+#
+# A 403 on a send to a private chat marks that user blocked
+# (see blocked_users.py) before the error is re-raised.
+# =========================================================
+
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", "30"))
+TG_GLOBAL_BURST = int(os.getenv("TG_GLOBAL_BURST", "30"))
+TG_CHAT_RATE = float(os.getenv("TG_CHAT_RATE", "1"))
+TG_CHAT_BURST = int(os.getenv("TG_CHAT_BURST", "3"))
+TG_GROUP_RATE = float(os.getenv("TG_GROUP_RATE", str(20 / 60)))
+TG_MAX_RETRIES = int(os.getenv("TG_MAX_RETRIES", "3"))
+
+THROTTLED_PREFIXES = ("Send", "Copy", "Forward")
+MAX_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """
+    Token bucket in reservation form: reserve() books the next free
+    slot and returns how long the caller must sleep, so waiters are
+    served in order without polling.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1 / rate
+        self.burst_window = (max(1, burst) - 1) * self.interval
+        self._next = 0.0
+
+    def reserve(self, now: float) -> float:
+        slot = max(self._next, now)
+        self._next = slot + self.interval
+        return max(0.0, slot - self.burst_window - now)
+
+    def pause_until(self, until: float):
+        self._next = max(self._next, until + self.burst_window)
+
+    def idle(self, now: float) -> bool:
+        return self._next <= now
+
+
+class TelegramRateLimiter(BaseRequestMiddleware):
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(TG_GLOBAL_RATE, TG_GLOBAL_BURST)
+        self._chat_buckets: dict = {}
+
+        # Metrics
+        self.requests = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.retry_after = 0
+        self.blocked = 0
+
+    def _chat_bucket(self, chat_id, now: float) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._chat_buckets = {
+                    k: b for k, b in self._chat_buckets.items() if not b.idle(now)
+                }
+            is_private = isinstance(chat_id, int) and chat_id > 0
+            bucket = TokenBucket(TG_CHAT_RATE, TG_CHAT_BURST) if is_private else TokenBucket(TG_GROUP_RATE)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def _wait_for_slot(self, chat_id):
+        waited = 0.0
+        if chat_id is not None:
+            delay = self._chat_bucket(chat_id, time.monotonic()).reserve(time.monotonic())
+            if delay:
+                await asyncio.sleep(delay)
+                waited += delay
+
+        delay = self.global_bucket.reserve(time.monotonic())
+        if delay:
+            await asyncio.sleep(delay)
+            waited += delay
+
+        if waited:
+            self.throttled += 1
+            self.total_wait += waited
+
+    async def __call__(self, make_request, bot, method):
+        throttled = type(method).__name__.startswith(THROTTLED_PREFIXES)
+        chat_id = getattr(method, "chat_id", None)
+        self.requests += 1
+
+        attempt = 0
+        while True:
+            if throttled:
+                await self._wait_for_slot(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramForbiddenError:
+                if throttled and isinstance(chat_id, int) and chat_id > 0:
+                    self.blocked += 1
+                    try:
+                        await mark_blocked(chat_id)
+                    except Exception as e:
+                        print(f"⚠️ Could not mark {chat_id} as blocked: {e}")
+                raise
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                if attempt >= TG_MAX_RETRIES:
+                    raise
+                attempt += 1
+                print(f"⏳ Telegram flood control on {type(method).__name__}, retrying in {e.retry_after}s")
+                self.global_bucket.pause_until(time.monotonic() + e.retry_after)
+                if not throttled:
+                    await asyncio.sleep(e.retry_after)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "total_wait_s": round(self.total_wait, 2),
+            "retry_after": self.retry_after,
+            "blocked": self.blocked,
+            "chat_buckets": len(self._chat_buckets),
+            "global_rate": TG_GLOBAL_RATE,
+        }
+
+
+rate_limiter = TelegramRateLimiter()
@@ -0,0 +1,192 @@
+import os
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import select, delete, update
+from sqlalchemy.orm import selectinload
+
+from backend.app.db.session import async_session
+from backend.app.db.models import Membership, ReminderOutbox
+from backend.app.tasks.reminder_worker import REMINDER_FLAGS, send_reminder, mark_reminded
+
+# =========================================================
+# REMINDER OUTBOX
+#
+# When a membership is created or extended its reminders are
+# written to reminder_outbox with the time they are due.
+# A poller job (every REMINDER_POLL_SECONDS) claims due rows
+# with FOR UPDATE SKIP LOCKED in a short transaction, sends
+# them with no transaction open, then records the results in
+# a second one, so each reminder fires on time and load is
+# spread across the day.
+#
+# The reminded_* flags stay the source of truth: the poller
+# sets them. Each row records the expiry_date it was
+# scheduled for; the 9/18 UTC sweep in reminder_worker.py
+# skips a reminder only when the membership has a row of that
+# kind for its current expiry_date, so memberships extended
+# without schedule_reminders() still get reminded.
+# =========================================================
+
+REMINDER_POLL_SECONDS = int(os.getenv("REMINDER_POLL_SECONDS", "60"))
+REMINDER_OUTBOX_BATCH = int(os.getenv("REMINDER_OUTBOX_BATCH", "100"))
+REMINDER_MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", "3"))
+REMINDER_RETRY_DELAY = timedelta(minutes=10)
+# How long a claimed row stays hidden from other pollers while its
+# batch is being sent; must comfortably exceed one batch's sends
+REMINDER_CLAIM_LEASE = timedelta(minutes=5)
+
+# When each reminder is due, relative to expiry_date
+REMINDER_OFFSETS = {
+    "7d": -timedelta(days=7),
+    "1d": -timedelta(days=1),
+    "expiry_day": -timedelta(hours=6),
+    "post_expiry": timedelta(hours=4),
+}
+
+
+async def schedule_reminders(session, membership: Membership):
+    """
+    Replace the pending reminders of a membership with fresh ones
+    for its current expiry_date. Call after creating or extending a
+    membership; the caller commits.
+    """
+    if membership.id is None:
+        await session.flush()
+
+    await session.execute(
+        delete(ReminderOutbox).where(
+            ReminderOutbox.membership_id == membership.id,
+            ReminderOutbox.status == "pending"
+        )
+    )
+
+    now = datetime.now(timezone.utc)
+    expiry = _aware(membership.expiry_date)
+    for kind, offset in REMINDER_OFFSETS.items():
+        due_at = expiry + offset
+        if due_at > now:
+            session.add(ReminderOutbox(
+                membership_id=membership.id, kind=kind, expiry_date=expiry, due_at=due_at
+            ))
+
+
+async def drain_reminder_outbox():
+    """Send every reminder that is due, REMINDER_OUTBOX_BATCH rows at a time."""
+    sent = 0
+    while True:
+        fetched, claimed, memberships = await _claim_due()
+
+        # Sent outside any transaction — no connection or row lock
+        # is held while the rate limiter paces the batch
+        now = datetime.now(timezone.utc)
+        results = [
+            (row, await send_reminder(memberships[row.membership_id], row.kind, now))
+            for row in claimed
+        ]
+        await _record_results(results, now)
+        sent += sum(1 for _, ok in results if ok)
+
+        if fetched < REMINDER_OUTBOX_BATCH:
+            break
+
+    if sent:
+        print(f"✅ Sent {sent} reminder(s) from the outbox")
+
+
+async def _claim_due():
+    """
+    Claim up to a batch of due rows in one short transaction: rows
+    still due get their due_at pushed out by REMINDER_CLAIM_LEASE
+    (other pollers skip them, and a crash before the results are
+    written makes them due again), the rest are marked skipped.
+    Returns (rows fetched, rows claimed, memberships by id).
+    """
+    now = datetime.now(timezone.utc)
+    async with async_session() as session:
+        result = await session.execute(
+            select(ReminderOutbox)
+            .where(
+                ReminderOutbox.status == "pending",
+                ReminderOutbox.due_at <= now
+            )
+            .order_by(ReminderOutbox.due_at)
+            .limit(REMINDER_OUTBOX_BATCH)
+            .with_for_update(skip_locked=True)
+        )
+        rows = result.scalars().all()
+        if not rows:
+            return 0, [], {}
+
+        result = await session.execute(
+            select(Membership)
+            .where(Membership.id.in_({row.membership_id for row in rows}))
+            .options(selectinload(Membership.user))
+            .options(selectinload(Membership.channel))
+        )
+        memberships = {m.id: m for m in result.scalars().all()}
+
+        claimed = []
+        for row in rows:
+            if not _still_due(memberships.get(row.membership_id), row.kind, now):
+                row.status = "skipped"
+                continue
+            row.attempts += 1
+            row.due_at = now + REMINDER_CLAIM_LEASE
+            claimed.append(row)
+        await session.commit()
+
+    return len(rows), claimed, memberships
+
+
+async def _record_results(results: list, now: datetime):
+    """Write the outcome of a claimed batch in a second short transaction."""
+    if not results:
+        return
+
+    sent_ids, failed_ids, retry_ids = [], [], []
+    reminded = {kind: [] for kind in REMINDER_FLAGS}
+    for row, ok in results:
+        if ok:
+            sent_ids.append(row.id)
+            reminded[row.kind].append(row.membership_id)
+        elif row.attempts >= REMINDER_MAX_ATTEMPTS:
+            failed_ids.append(row.id)
+        else:
+            retry_ids.append(row.id)
+
+    async with async_session() as session:
+        for ids, values in (
+            (sent_ids, {"status": "sent", "sent_at": now}),
+            (failed_ids, {"status": "failed"}),
+            (retry_ids, {"due_at": now + REMINDER_RETRY_DELAY}),
+        ):
+            if ids:
+                await session.execute(
+                    update(ReminderOutbox).where(ReminderOutbox.id.in_(ids)).values(**values)
+                )
+        for kind, membership_ids in reminded.items():
+            await mark_reminded(session, kind, membership_ids)
+        await session.commit()
+
+
+def _still_due(m: Membership | None, kind: str, now: datetime) -> bool:
+    """
+    Re-check a claimed row against the membership as it is now:
+    renewed, expired, already reminded or blocked rows are skipped.
+    """
+    if m is None or m.user.is_blocked:
+        return False
+
+    expiry = _aware(m.expiry_date)
+    if kind == "post_expiry":
+        return not m.is_active and now - timedelta(days=1) < expiry <= now
+
+    flag = REMINDER_FLAGS[kind]
+    if not m.is_active or getattr(m, flag):
+        return False
+    # Leave a renewed membership (expiry pushed out) to its new rows
+    return now < expiry <= now - REMINDER_OFFSETS[kind] + timedelta(days=1)
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
@@ -2,8 +2,13 @@
 # SYSTEM 1 - TIER ENGINE
 # =========================================================
 
+import os
+from functools import lru_cache
+from types import MappingProxyType
+
 from sqlalchemy import select, func
 from backend.app.db.models import Membership
+from backend.app.services.ttl_cache import TTLCache
 
 # =========================================================
 # TIER PRICING CONFIGURATION
@@ -47,6 +52,32 @@ TIER_PLANS = {
     },
 }
 
+LIFETIME_DAYS = 9999
+
+
+# =========================================================
+# PRECOMPUTED PLAN TABLES
+#
+# Built once from TIER_PLANS. Plans are read-only mappings in
+# tuples, so get_plans_for_user can hand out the same objects
+# on every call without a caller being able to alter prices.
+# =========================================================
+
+def _freeze_plan(plan: dict):
+    return MappingProxyType(dict(plan))
+
+
+PLANS_BY_TIER = {
+    tier: tuple(_freeze_plan(plan) for plan in config["plans"])
+    for tier, config in TIER_PLANS.items()
+}
+
+PRICE_BY_TIER_DAYS = {
+    (tier, plan["days"]): plan["price"]
+    for tier, plans in PLANS_BY_TIER.items()
+    for plan in plans
+}
+
 
 # =========================================================
 # TIER CALCULATION FROM AMOUNT
@@ -70,27 +101,54 @@ def calculate_tier_from_amount(amount: int) -> int:
 
 def get_price_for_validity(tier: int, validity_days: int):
     """Get price for a specific tier and validity days"""
-    plans = TIER_PLANS.get(tier, {}).get("plans", [])
-    for plan in plans:
-        if plan["days"] == validity_days:
-            return plan["price"]
-    return None
+    return PRICE_BY_TIER_DAYS.get((tier, validity_days))
 
 
 # =========================================================
 # LIFETIME ESCALATION
+#
+# The lifetime plan price depends on how many lifetime
+# memberships the user already holds. That count is cached
+# per user, in this process only: paths that create
+# memberships call refresh_lifetime_count() or
+# invalidate_lifetime_count() after committing, and entries
+# expire after LIFETIME_COUNT_TTL seconds so other processes
+# catch up too. The cache only speeds up the plan screens —
+# checkout re-counts before a lifetime price is charged.
 # =========================================================
 
+LIFETIME_COUNT_CACHE_SIZE = int(os.getenv("LIFETIME_COUNT_CACHE_SIZE", "10000"))
+LIFETIME_COUNT_TTL = float(os.getenv("LIFETIME_COUNT_TTL", "30"))
+
+lifetime_counts: TTLCache[int, int] = TTLCache(LIFETIME_COUNT_CACHE_SIZE, LIFETIME_COUNT_TTL)
+
+
 async def get_lifetime_channel_count(session, user_id: int) -> int:
+    count = lifetime_counts.get(user_id)
+    if count is not None:
+        return count
+
     result = await session.execute(
         select(func.count())
         .select_from(Membership)
         .where(
             Membership.user_id == user_id,
-            Membership.validity_days == 9999
+            Membership.validity_days == LIFETIME_DAYS
         )
     )
-    return result.scalar() or 0
+    count = result.scalar() or 0
+    lifetime_counts.put(user_id, count)
+    return count
+
+
+def invalidate_lifetime_count(user_id: int):
+    lifetime_counts.invalidate(user_id)
+
+
+async def refresh_lifetime_count(session, user_id: int) -> int:
+    """Re-count after a lifetime membership was committed."""
+    invalidate_lifetime_count(user_id)
+    return await get_lifetime_channel_count(session, user_id)
 
 
 def round_price(price: float) -> int:
@@ -102,6 +160,7 @@ def round_price(price: float) -> int:
         return price - remainder + 199
 
 
+@lru_cache(maxsize=1024)
 def calculate_escalated_price(base_price: int, lifetime_count: int) -> int:
     """
     Escalation starts after 3 lifetime purchases.
@@ -140,7 +199,8 @@ def get_user_tier_for_channel(user, channel_id: int) -> int:
 
 async def get_plans_for_user(user, channel_id: int, session=None):
     """
-    Returns list of plans to show user for a channel.
+    Returns the plans to show user for a channel, as a tuple of
+    read-only mappings.
 
     Lifetime mode: user sees only lifetime plan (escalated price).
     Normal mode:   user sees plans based on their tier.
@@ -159,16 +219,16 @@ async def get_plans_for_user(user, channel_id: int, session=None):
             base_price = 999
 
         price = calculate_escalated_price(base_price, lifetime_count)
-
-        return [{
-            "validity": "Lifetime",
-            "days": 9999,
-            "price": price
-        }]
+        return _lifetime_plans(price)
 
     # ── NORMAL MODE ────────────────────────────────────────
     tier = get_user_tier_for_channel(user, channel_id)
-    return TIER_PLANS[tier]["plans"]
+    return PLANS_BY_TIER[tier]
+
+
+@lru_cache(maxsize=256)
+def _lifetime_plans(price: int):
+    return (_freeze_plan({"validity": "Lifetime", "days": LIFETIME_DAYS, "price": price}),)
 
 
 # =========================================================
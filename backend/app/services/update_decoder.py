@@ -0,0 +1,37 @@
+import os
+
+from aiogram.types import Update
+
+from backend.bot.bot import bot
+
+# =========================================================
+# TELEGRAM UPDATE DECODING
+#
+# The webhook body is validated straight from raw bytes and
+# bound to our Bot instance. Binding matters: feed_update()
+# re-dumps and re-validates any update that is not mounted
+# on the bot it is fed to.
+#
+# UPDATE_JSON_BACKEND:
+#   pydantic — Update.model_validate_json (pydantic-core parser). Default.
+#   orjson   — orjson.loads + model_validate, if orjson is installed.
+#              Optional: `pip install orjson` on the deploy target;
+#              it is not in requirements.txt.
+# =========================================================
+
+UPDATE_JSON_BACKEND = os.getenv("UPDATE_JSON_BACKEND", "pydantic")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if UPDATE_JSON_BACKEND == "orjson" and orjson is None:
+    print("⚠️ UPDATE_JSON_BACKEND=orjson but orjson is not installed, using pydantic")
+    UPDATE_JSON_BACKEND = "pydantic"
+
+
+def decode_update(body: bytes, backend: str = UPDATE_JSON_BACKEND) -> Update:
+    if backend == "orjson":
+        return Update.model_validate(orjson.loads(body), context={"bot": bot})
+    return Update.model_validate_json(body, context={"bot": bot})
@@ -0,0 +1,104 @@
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+
+from backend.app.db.session import async_session
+from backend.app.db.models import ProcessedUpdate
+
+# =========================================================
+# TELEGRAM UPDATE DEDUPLICATION
+#
+# Telegram redelivers an update when the webhook times out,
+# so the same update_id can arrive twice. A bounded LRU of
+# recently seen ids sits in front of the update queue.
+#
+# memory — per-process LRU only (single worker). Default.
+# db     — LRU first, then an INSERT ... ON CONFLICT DO NOTHING
+#          into processed_updates so several processes agree.
+# =========================================================
+
+UPDATE_DEDUP_SIZE = int(os.getenv("UPDATE_DEDUP_SIZE", "10000"))
+UPDATE_DEDUP_BACKEND = os.getenv("UPDATE_DEDUP_BACKEND", "memory")
+UPDATE_DEDUP_RETENTION_HOURS = int(os.getenv("UPDATE_DEDUP_RETENTION_HOURS", "48"))
+
+
+class UpdateDeduplicator:
+
+    def __init__(self, maxsize: int = UPDATE_DEDUP_SIZE, backend: str = UPDATE_DEDUP_BACKEND):
+        if backend not in ("memory", "db"):
+            raise ValueError(f"Unknown update dedup backend: {backend}")
+
+        self.maxsize = maxsize
+        self.backend = backend
+        self._seen: OrderedDict[int, None] = OrderedDict()
+        self.duplicates = 0
+
+    def _remember(self, update_id: int):
+        self._seen[update_id] = None
+        if len(self._seen) > self.maxsize:
+            self._seen.popitem(last=False)
+
+    async def is_duplicate(self, update_id: int) -> bool:
+        """Return True if update_id was already accepted, else record it."""
+        if update_id in self._seen:
+            self._seen.move_to_end(update_id)
+            self.duplicates += 1
+            return True
+
+        if self.backend == "db":
+            async with async_session() as session:
+                result = await session.execute(
+                    insert(ProcessedUpdate)
+                    .values(update_id=update_id, created_at=datetime.now(timezone.utc))
+                    .on_conflict_do_nothing(index_elements=[ProcessedUpdate.update_id])
+                    .returning(ProcessedUpdate.update_id)
+                )
+                inserted = result.scalar_one_or_none()
+                await session.commit()
+
+            if inserted is None:
+                self._remember(update_id)
+                self.duplicates += 1
+                return True
+
+        self._remember(update_id)
+        return False
+
+    async def forget(self, update_id: int):
+        """Undo is_duplicate() for an update we could not accept."""
+        self._seen.pop(update_id, None)
+
+        if self.backend == "db":
+            async with async_session() as session:
+                await session.execute(
+                    delete(ProcessedUpdate).where(ProcessedUpdate.update_id == update_id)
+                )
+                await session.commit()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "tracked": len(self._seen),
+            "capacity": self.maxsize,
+            "duplicates": self.duplicates,
+        }
+
+
+update_dedup = UpdateDeduplicator()
+
+
+async def prune_processed_updates():
+    """Drop processed_updates rows older than the retention window."""
+    if update_dedup.backend != "db":
+        return
+
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=UPDATE_DEDUP_RETENTION_HOURS)
+    async with async_session() as session:
+        result = await session.execute(
+            delete(ProcessedUpdate).where(ProcessedUpdate.created_at < cutoff)
+        )
+        await session.commit()
+    print(f"🧹 Pruned {result.rowcount} processed update id(s)")
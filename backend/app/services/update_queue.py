@@ -0,0 +1,202 @@
+import asyncio
+import os
+import time
+
+from aiogram.types import Update
+
+from backend.bot.bot import bot, dp
+
+# =========================================================
+# TELEGRAM UPDATE QUEUE
+#
+# The webhook only validates the update and puts it on a
+# bounded in-process queue. Consumer tasks feed the
+# dispatcher, so slow handlers (exports, CSV imports)
+# never hold the HTTP request open.
+#
+# Dispatch modes:
+#   lanes — one queue + one consumer per lane; updates are
+#           sharded by user/chat id so a single user's updates
+#           stay in order (FSM flows) while different users
+#           run in parallel. Default.
+#   pool  — one shared queue, any worker takes any update.
+#
+# UPDATE_QUEUE_SIZE bounds the updates queued in total, across
+# all lanes. UPDATE_LANE_SIZE additionally caps a single lane
+# (defaults to the total, so one busy user or hot shard can use
+# the free capacity instead of being rejected while other lanes
+# sit empty); lower it to stop one shard starving the rest.
+# =========================================================
+
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "1000"))
+UPDATE_LANE_SIZE = int(os.getenv("UPDATE_LANE_SIZE", str(UPDATE_QUEUE_SIZE)))
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "8"))
+UPDATE_DISPATCH_MODE = os.getenv("UPDATE_DISPATCH_MODE", "lanes")
+
+
+def update_shard_key(update: Update) -> int:
+    """User id if the update has one, else chat id, else update id."""
+    try:
+        event = update.event
+    except LookupError:
+        return update.update_id
+    user = getattr(event, "from_user", None) or getattr(event, "user", None)
+    if user:
+        return user.id
+    chat = getattr(event, "chat", None)
+    if chat:
+        return chat.id
+    return update.update_id
+
+
+class UpdateQueue:
+
+    def __init__(
+        self,
+        bot,
+        dp,
+        workers: int = UPDATE_WORKERS,
+        maxsize: int = UPDATE_QUEUE_SIZE,
+        mode: str = UPDATE_DISPATCH_MODE,
+        lane_size: int = UPDATE_LANE_SIZE,
+    ):
+        if mode not in ("lanes", "pool"):
+            raise ValueError(f"Unknown update dispatch mode: {mode}")
+
+        self.bot = bot
+        self.dp = dp
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self.lane_size = max(1, min(lane_size, maxsize))
+        self.mode = mode
+
+        self._queues: list[asyncio.Queue] = []
+        self._tasks: list[asyncio.Task] = []
+
+        # Metrics
+        self.received = 0
+        self.started = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_handle = 0.0
+        self.max_handle = 0.0
+
+    # ── Lifecycle ────────────────────────────────────────
+
+    def start(self):
+        if self._tasks:
+            return
+        if self.mode == "lanes":
+            self._queues = [asyncio.Queue(maxsize=self.lane_size) for _ in range(self.workers)]
+            self._tasks = [
+                asyncio.create_task(self._worker(i, queue), name=f"update-lane-{i}")
+                for i, queue in enumerate(self._queues)
+            ]
+        else:
+            queue = asyncio.Queue(maxsize=self.maxsize)
+            self._queues = [queue]
+            self._tasks = [
+                asyncio.create_task(self._worker(i, queue), name=f"update-worker-{i}")
+                for i in range(self.workers)
+            ]
+        print(f"✅ Update queue started ({self.mode}, {self.workers} workers, max {self.maxsize} queued)")
+
+    async def stop(self, timeout: float = 10):
+        """Drain what is already queued, then cancel the workers."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"⚠️ Update queue stopped with {self.depth()} update(s) pending")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ── Producer ─────────────────────────────────────────
+
+    def submit(self, update: Update) -> bool:
+        """
+        Enqueue an update without waiting.
+        Returns False when the queue is full so the webhook can
+        push back and let Telegram redeliver later.
+        """
+        if self.mode == "lanes":
+            queue = self._queues[update_shard_key(update) % len(self._queues)]
+            if self.depth() >= self.maxsize:
+                self.rejected += 1
+                return False
+        else:
+            queue = self._queues[0]
+
+        try:
+            queue.put_nowait((update, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+
+        self.received += 1
+        self.max_depth = max(self.max_depth, self.depth())
+        return True
+
+    # ── Consumers ────────────────────────────────────────
+
+    async def _worker(self, index: int, queue: asyncio.Queue):
+        while True:
+            update, enqueued_at = await queue.get()
+            started = time.perf_counter()
+            wait = started - enqueued_at
+            self.started += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+            try:
+                await self.dp.feed_update(self.bot, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Update {update.update_id} failed in worker {index}: {e}")
+            finally:
+                handle = time.perf_counter() - started
+                self.total_handle += handle
+                self.max_handle = max(self.max_handle, handle)
+                queue.task_done()
+
+    # ── Metrics ──────────────────────────────────────────
+
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    def stats(self) -> dict:
+        done = self.processed + self.failed
+        stats = {
+            "mode": self.mode,
+            "workers": self.workers,
+            "running": bool(self._tasks),
+            "depth": self.depth(),
+            "max_depth": self.max_depth,
+            "capacity": self.maxsize,
+            "received": self.received,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait / self.started * 1000, 2) if self.started else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "avg_handle_ms": round(self.total_handle / done * 1000, 2) if done else 0.0,
+            "max_handle_ms": round(self.max_handle * 1000, 2),
+        }
+        if self.mode == "lanes":
+            stats["lane_capacity"] = self.lane_size
+            stats["lane_depths"] = [queue.qsize() for queue in self._queues]
+        return stats
+
+
+update_queue = UpdateQueue(bot, dp)
@@ -0,0 +1,77 @@
+import os
+from typing import NamedTuple
+
+from sqlalchemy import select
+
+from backend.app.db.models import User
+from backend.app.services.ttl_cache import TTLCache
+
+# =========================================================
+# USER PROFILE CACHE
+#
+# Every button press resolves the caller's User row, but the
+# fields the interactive paths read (tier, highest amount
+# paid, lifetime flags) only change on a payment or an admin
+# action. A bounded LRU of immutable UserSnapshots keyed by
+# telegram_id lets the DB session middleware skip that
+# lookup.
+#
+# Entries expire after USER_CACHE_TTL seconds. Writers in
+# this process call user_cache.invalidate(telegram_id) after
+# they commit; other processes pick the change up when the
+# TTL runs out, so keep it short.
+#
+# Snapshots are read-only — load the row with
+# session.get(User, snapshot.id) before changing it.
+# =========================================================
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+
+class UserSnapshot(NamedTuple):
+    id: int
+    telegram_id: int
+    current_tier: int | None
+    highest_amount_paid: float
+    is_lifetime_member: bool
+    lifetime_amount: float
+    is_blocked: bool
+
+
+def snapshot_user(user: User) -> UserSnapshot:
+    return UserSnapshot(
+        id=user.id,
+        telegram_id=user.telegram_id,
+        current_tier=user.current_tier,
+        highest_amount_paid=float(user.highest_amount_paid or 0),
+        is_lifetime_member=bool(user.is_lifetime_member),
+        lifetime_amount=float(user.lifetime_amount or 0),
+        is_blocked=bool(user.is_blocked),
+    )
+
+
+class UserCache(TTLCache[int, UserSnapshot]):
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        super().__init__(maxsize, ttl)
+
+    async def load(self, session, telegram_id: int) -> UserSnapshot | None:
+        """Cached snapshot, or read it through from the users table."""
+        snapshot = self.get(telegram_id)
+        if snapshot is not None:
+            return snapshot
+
+        result = await session.execute(
+            select(User).where(User.telegram_id == telegram_id)
+        )
+        user = result.scalar_one_or_none()
+        if user is None:
+            # Not cached: /start creates the row moments later
+            return None
+        snapshot = snapshot_user(user)
+        self.put(telegram_id, snapshot)
+        return snapshot
+
+
+user_cache = UserCache()
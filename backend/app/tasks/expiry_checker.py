@@ -1,94 +1,214 @@
+import os
+from functools import partial
 from datetime import datetime, timezone
-from sqlalchemy import select
+from sqlalchemy import select, update, tuple_
 from sqlalchemy.orm import selectinload
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from backend.app.db.session import async_session
+from backend.app.services.concurrency import run_bounded
 from backend.app.db.models import Membership
 from backend.bot.bot import bot
 
+EXPIRY_BATCH_SIZE = int(os.getenv("EXPIRY_BATCH_SIZE", "200"))
+EXPIRY_CONCURRENCY = int(os.getenv("EXPIRY_CONCURRENCY", "20"))
+
+
+# =========================================================
+# EXPIRY CHECK
+#
+# Due memberships are fetched and committed in batches of
+# EXPIRY_BATCH_SIZE, each batch in two steps:
+#
+#   1. ban + unban every member not yet removed, commit
+#      kicked_at
+#   2. send the expiry notice to everyone removed but not
+#      yet told, commit notified_at and is_active = False for
+#      everyone removed
+#
+# Both steps run EXPIRY_CONCURRENCY workers under the shared
+# Telegram rate limiter. The stamps make re-runs idempotent:
+# a crash repeats at most the uncommitted step of one batch,
+# and row locks last one batch rather than the whole run.
+#
+# Stamps and deactivation are written with set-based UPDATEs
+# guarded by expiry_date < now, never by flushing the rows
+# loaded at the start of the batch: a membership renewed
+# while the batch was being kicked keeps its new expiry and
+# stays active. Renewal paths lock the row (FOR UPDATE) so
+# they serialize with these UPDATEs, and clear kicked_at /
+# notified_at.
+#
+# Every membership ends with an outcome:
+#   notified       removed and told
+#   removed        removed, no notice (user blocked the bot)
+#   notify_failed  removed, notice failed
+#   kick_failed    transient error removing from the channel
+#                  (network, flood wait); left active so the
+#                  next run retries the kick
+#   unremovable    Telegram refused the kick for good (bot
+#                  lost its rights, channel gone, user not a
+#                  member); deactivated without a kick so it
+#                  stops counting as a member — check the log
+# =========================================================
+
 
 async def run_expiry_check():
     """
     Check for expired memberships and remove users from channels
-    Also resets reminder flags for renewed memberships
     """
     print("🔍 Running expiry check...")
-    
+
+    now = datetime.now(timezone.utc)
+    outcomes = {"notified": 0, "removed": 0, "notify_failed": 0, "kick_failed": 0, "unremovable": 0}
+
     async with async_session() as session:
-        # Load active memberships with related user and channel data
-        result = await session.execute(
-            select(Membership)
-            .where(Membership.is_active == True)
-            .options(selectinload(Membership.user))
-            .options(selectinload(Membership.channel))
+        # Only rows that are due, oldest first (served by
+        # ix_memberships_active_expiry), paged by (expiry_date, id)
+        # because kick_failed rows stay active and would otherwise
+        # come back in the next batch.
+        after = None
+        while True:
+            query = select(Membership).where(
+                Membership.is_active == True,
+                Membership.expiry_date < now
+            )
+            if after is not None:
+                query = query.where(tuple_(Membership.expiry_date, Membership.id) > after)
+            result = await session.execute(
+                query
+                .order_by(Membership.expiry_date, Membership.id)
+                .limit(EXPIRY_BATCH_SIZE)
+                .options(selectinload(Membership.user))
+                .options(selectinload(Membership.channel))
+            )
+            memberships = result.scalars().all()
+            if not memberships:
+                break
+            after = (memberships[-1].expiry_date, memberships[-1].id)
+            # Read-only from here on: the stamps set on these objects
+            # track progress in memory, the guarded UPDATEs persist it
+            session.expunge_all()
+
+            # Step 1 — remove from the channel
+            to_kick = [m for m in memberships if m.kicked_at is None]
+            unremovable = set()
+            await run_bounded(to_kick, partial(_kick_one, unremovable=unremovable), EXPIRY_CONCURRENCY)
+            await _stamp(session, now, [m for m in to_kick if m.kicked_at], kicked_at=datetime.now(timezone.utc))
+            await session.commit()
+
+            # Step 2 — tell them
+            to_notify = [
+                m for m in memberships
+                if m.kicked_at and m.notified_at is None and not m.user.is_blocked
+            ]
+            await run_bounded(to_notify, _notify_one, EXPIRY_CONCURRENCY)
+            await _stamp(session, now, [m for m in to_notify if m.notified_at], notified_at=datetime.now(timezone.utc))
+            await _stamp(
+                session, now,
+                [m for m in memberships if m.kicked_at or m.id in unremovable],
+                is_active=False
+            )
+            for m in memberships:
+                outcomes["unremovable" if m.id in unremovable else _outcome(m)] += 1
+            await session.commit()
+
+    expired_count = sum(outcomes.values())
+    if expired_count > 0:
+        print(
+            f"✅ Processed {expired_count} expired membership(s) — "
+            f"notified {outcomes['notified']}, removed silently {outcomes['removed']}, "
+            f"notice failed {outcomes['notify_failed']}, kick failed {outcomes['kick_failed']}, "
+            f"unremovable {outcomes['unremovable']}"
+        )
+    else:
+        print("✅ No expired memberships found")
+
+
+async def _stamp(session, now: datetime, memberships: list, **values):
+    """UPDATE the given memberships, skipping any renewed since they were loaded."""
+    if not memberships:
+        return
+    await session.execute(
+        update(Membership)
+        .where(
+            Membership.id.in_([m.id for m in memberships]),
+            Membership.is_active == True,
+            Membership.expiry_date < now
         )
-        memberships = result.scalars().all()
-        
-        now = datetime.now(timezone.utc)
-        expired_count = 0
-        
-        for m in memberships:
-            if not m.expiry_date:
-                continue
-            
-            # Make timezone-aware if needed
-            expiry_tz = m.expiry_date
-            if expiry_tz.tzinfo is None:
-                expiry_tz = expiry_tz.replace(tzinfo=timezone.utc)
-            
-            if expiry_tz < now:
-                # Mark as inactive
-                m.is_active = False
-                expired_count += 1
-                
-                try:
-                    # Remove user from Telegram channel
-                    await bot.ban_chat_member(
-                        chat_id=m.channel.telegram_chat_id,
-                        user_id=m.user.telegram_id
-                    )
-                    
-                    # Immediately unban so they can rejoin if they renew
-                    await bot.unban_chat_member(
-                        chat_id=m.channel.telegram_chat_id,
-                        user_id=m.user.telegram_id
-                    )
-                    
-                    print(f"✅ Removed user {m.user.telegram_id} from channel {m.channel.name}")
-                    
-                    # Create renewal button
-                    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(
-                            text="🔄 Renew Now",
-                            callback_data=f"userch_{m.channel_id}"
-                        )],
-                        [InlineKeyboardButton(
-                            text="📋 My Plans",
-                            callback_data="my_plans"
-                        )]
-                    ])
-                    
-                    # Notify user
-                    await bot.send_message(
-                        chat_id=m.user.telegram_id,
-                        text=(
-                            f"❌ <b>Membership Expired</b>\n\n"
-                            f"Your access to <b>{m.channel.name}</b> has ended.\n\n"
-                            f"📅 Expired on: {expiry_tz.strftime('%d %b %Y')}\n\n"
-                            f"💡 Click below to renew and regain access!"
-                        ),
-                        reply_markup=keyboard,
-                        parse_mode="HTML"
-                    )
-                    
-                except Exception as e:
-                    print(f"⚠️ Failed to process expiry for user {m.user.telegram_id}: {e}")
-        
-        # Commit all changes
-        await session.commit()
-        
-        if expired_count > 0:
-            print(f"✅ Processed {expired_count} expired membership(s)")
-        else:
-            print("✅ No expired memberships found")
\ No newline at end of file
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _outcome(m: Membership) -> str:
+    if m.kicked_at is None:
+        return "kick_failed"
+    if m.notified_at:
+        return "notified"
+    if m.user.is_blocked:
+        return "removed"
+    return "notify_failed"
+
+
+async def _kick_one(m: Membership, unremovable: set):
+    try:
+        # Remove user from Telegram channel
+        await bot.ban_chat_member(
+            chat_id=m.channel.telegram_chat_id,
+            user_id=m.user.telegram_id
+        )
+
+        # Immediately unban so they can rejoin if they renew
+        await bot.unban_chat_member(
+            chat_id=m.channel.telegram_chat_id,
+            user_id=m.user.telegram_id
+        )
+    except (TelegramForbiddenError, TelegramBadRequest) as e:
+        # Retrying won't help — deactivate and leave it to an admin
+        unremovable.add(m.id)
+        print(f"❌ Cannot remove user {m.user.telegram_id} from {m.channel.name}, deactivating: {e}")
+        return
+    except Exception as e:
+        print(f"⚠️ Failed to remove user {m.user.telegram_id} from {m.channel.name}: {e}")
+        return
+
+    m.kicked_at = datetime.now(timezone.utc)
+    print(f"✅ Removed user {m.user.telegram_id} from channel {m.channel.name}")
+
+
+async def _notify_one(m: Membership):
+    expiry_tz = m.expiry_date
+    if expiry_tz.tzinfo is None:
+        expiry_tz = expiry_tz.replace(tzinfo=timezone.utc)
+
+    # Create renewal button
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text="🔄 Renew Now",
+            callback_data=f"userch_{m.channel_id}"
+        )],
+        [InlineKeyboardButton(
+            text="📋 My Plans",
+            callback_data="my_plans"
+        )]
+    ])
+
+    try:
+        await bot.send_message(
+            chat_id=m.user.telegram_id,
+            text=(
+                f"❌ <b>Membership Expired</b>\n\n"
+                f"Your access to <b>{m.channel.name}</b> has ended.\n\n"
+                f"📅 Expired on: {expiry_tz.strftime('%d %b %Y')}\n\n"
+                f"💡 Click below to renew and regain access!"
+            ),
+            reply_markup=keyboard,
+            parse_mode="HTML"
+        )
+    except Exception as e:
+        print(f"⚠️ Failed to notify user {m.user.telegram_id} of expiry: {e}")
+        return
+
+    m.notified_at = datetime.now(timezone.utc)
@@ -1,13 +1,70 @@
 from datetime import datetime, timezone, timedelta
-from sqlalchemy import select
+from sqlalchemy import select, update, any_, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import selectinload
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from backend.app.db.session import async_session
-from backend.app.db.models import Membership
+from backend.app.db.models import Membership, User, ReminderOutbox
 from backend.bot.bot import bot
 
 
+# =========================================================
+# REMINDER BUCKETS
+#
+# Each reminder is its own range query on expiry_date
+# (ix_memberships_active_expiry / ix_memberships_expiry_date)
+# plus its reminded_* flag, so a run only loads the rows that
+# are due. A reminder with a reminder_outbox row of the same
+# kind for the membership's current expiry_date is left to the
+# outbox poller (services/reminder_outbox.py); this sweep is
+# the safety net for the rest, including memberships extended
+# since their rows were written. The windows match the old
+# days_left logic:
+#
+#   7d           expiry in [now + 7d, now + 8d)
+#   1d           expiry in [now + 1d, now + 2d)
+#   expiry_day   expiry in (now, now + 1d)
+#   post_expiry  expired, expiry in [now - 5h, now - 4h]
+# =========================================================
+
+REMINDER_FLAGS = {
+    "7d": "reminded_7d",
+    "1d": "reminded_1d",
+    "expiry_day": "reminded_expired",
+    "post_expiry": None,
+}
+
+
+def reminder_windows(now: datetime) -> dict:
+    """SQL conditions selecting the memberships due for each reminder kind."""
+    return {
+        "7d": (
+            Membership.is_active == True,
+            Membership.expiry_date >= now + timedelta(days=7),
+            Membership.expiry_date < now + timedelta(days=8),
+            Membership.reminded_7d.is_not(True),
+        ),
+        "1d": (
+            Membership.is_active == True,
+            Membership.expiry_date >= now + timedelta(days=1),
+            Membership.expiry_date < now + timedelta(days=2),
+            Membership.reminded_1d.is_not(True),
+        ),
+        "expiry_day": (
+            Membership.is_active == True,
+            Membership.expiry_date > now,
+            Membership.expiry_date < now + timedelta(days=1),
+            Membership.reminded_expired.is_not(True),
+        ),
+        "post_expiry": (
+            Membership.is_active == False,
+            Membership.expiry_date >= now - timedelta(hours=5),
+            Membership.expiry_date <= now - timedelta(hours=4),
+        ),
+    }
+
+
 async def run_reminder_check():
     """
     Send reminders to users whose membership is expiring soon
@@ -18,147 +75,137 @@ async def run_reminder_check():
     - 4 hours after expiry
     """
     print("🔔 Running reminder check...")
-    
+
+    now = datetime.now(timezone.utc)
+    reminder_count = 0
+
     async with async_session() as session:
-        # Load active + recently expired memberships
-        result = await session.execute(
-            select(Membership)
-            .options(selectinload(Membership.user))
-            .options(selectinload(Membership.channel))
-        )
-        memberships = result.scalars().all()
-        
-        now = datetime.now(timezone.utc)
-        reminder_count = 0
-        
-        for m in memberships:
-            if not m.expiry_date:
-                continue
-            
-            expiry_tz = m.expiry_date
-            if expiry_tz.tzinfo is None:
-                expiry_tz = expiry_tz.replace(tzinfo=timezone.utc)
-            
-            time_diff = expiry_tz - now
-            days_left = time_diff.days
-            hours_left = time_diff.total_seconds() / 3600
-
-            # Renew button
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(
-                    text="🔄 Renew Now",
-                    callback_data=f"userch_{m.channel_id}"
-                )],
-                [InlineKeyboardButton(
-                    text="📋 My Plans",
-                    callback_data="my_plans"
-                )]
-            ])
-
-            # ==========================================
-            # 7 DAYS BEFORE EXPIRY
-            # ==========================================
-            if days_left == 7 and m.is_active and not m.reminded_7d:
-                try:
-                    await bot.send_message(
-                        chat_id=m.user.telegram_id,
-                        text=(
-                            f"⏰ <b>Reminder: Your Membership Expires Soon</b>\n\n"
-                            f"📺 Channel: <b>{m.channel.name}</b>\n"
-                            f"📅 Expires on: <b>{expiry_tz.strftime('%d %b %Y')}</b>\n"
-                            f"⏳ Time left: <b>7 days</b>\n\n"
-                            f"💡 Renew now to keep enjoying uninterrupted access.\n\n"
-                            f"Tap below to renew 👇"
-                        ),
-                        reply_markup=keyboard,
-                        parse_mode="HTML"
-                    )
-                    m.reminded_7d = True
-                    reminder_count += 1
-                    print(f"✅ 7-day reminder sent to user {m.user.telegram_id} for {m.channel.name}")
-                except Exception as e:
-                    print(f"⚠️ Failed to send 7-day reminder to {m.user.telegram_id}: {e}")
-
-            # ==========================================
-            # 1 DAY BEFORE EXPIRY
-            # ==========================================
-            elif days_left == 1 and m.is_active and not m.reminded_1d:
-                try:
-                    await bot.send_message(
-                        chat_id=m.user.telegram_id,
-                        text=(
-                            f"⏰ <b>Reminder: Your Membership Expires Soon</b>\n\n"
-                            f"📺 Channel: <b>{m.channel.name}</b>\n"
-                            f"📅 Expires on: <b>{expiry_tz.strftime('%d %b %Y')}</b>\n"
-                            f"⏳ Time left: <b>Less than 24 hours</b>\n\n"
-                            f"💡 Renew now to keep enjoying uninterrupted access.\n\n"
-                            f"Tap below to renew 👇"
-                        ),
-                        reply_markup=keyboard,
-                        parse_mode="HTML"
-                    )
-                    m.reminded_1d = True
-                    reminder_count += 1
-                    print(f"✅ 1-day reminder sent to user {m.user.telegram_id} for {m.channel.name}")
-                except Exception as e:
-                    print(f"⚠️ Failed to send 1-day reminder to {m.user.telegram_id}: {e}")
-
-            # ==========================================
-            # ON EXPIRY DAY (before it expires)
-            # ==========================================
-            elif days_left == 0 and hours_left > 0 and m.is_active and not m.reminded_expired:
-                try:
-                    hours_remaining = int(hours_left)
-                    await bot.send_message(
-                        chat_id=m.user.telegram_id,
-                        text=(
-                            f"🔴 <b>Final Reminder: Membership Expires Today</b>\n\n"
-                            f"📺 Channel: <b>{m.channel.name}</b>\n"
-                            f"📅 Expires today at: <b>{expiry_tz.strftime('%I:%M %p')}</b>\n"
-                            f"⏳ Time left: <b>~{hours_remaining} hours</b>\n\n"
-                            f"⚡ Renew now to keep your access active."
-                        ),
-                        reply_markup=keyboard,
-                        parse_mode="HTML"
+        for kind, conditions in reminder_windows(now).items():
+            result = await session.execute(
+                select(Membership)
+                .join(User, User.id == Membership.user_id)
+                .where(
+                    User.is_blocked == False,
+                    ~select(ReminderOutbox.id)
+                    .where(
+                        ReminderOutbox.membership_id == Membership.id,
+                        ReminderOutbox.kind == kind,
+                        ReminderOutbox.expiry_date == Membership.expiry_date
                     )
-                    m.reminded_expired = True
-                    reminder_count += 1
-                    print(f"✅ Expiry-day reminder sent to user {m.user.telegram_id} for {m.channel.name}")
-                except Exception as e:
-                    print(f"⚠️ Failed to send expiry-day reminder to {m.user.telegram_id}: {e}")
-
-            # ==========================================
-            # 4 HOURS AFTER EXPIRY
-            # ==========================================
-            elif not m.is_active and hours_left <= -4 and hours_left >= -5:
-                try:
-                    await bot.send_message(
-                        chat_id=m.user.telegram_id,
-                        text=(
-                            f"⌛ <b>Your Membership Has Expired</b>\n\n"
-                            f"📺 Channel: <b>{m.channel.name}</b>\n"
-                            f"Access to this channel has ended.\n\n"
-                            f"🔄 Renew now to regain access instantly."
-                        ),
-                        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                            [InlineKeyboardButton(
-                                text="🔄 Renew Now",
-                                callback_data=f"userch_{m.channel_id}"
-                            )]
-                        ]),
-                        parse_mode="HTML"
-                    )
-                    reminder_count += 1
-                    print(f"✅ Post-expiry reminder sent to user {m.user.telegram_id} for {m.channel.name}")
-                except Exception as e:
-                    print(f"⚠️ Failed to send post-expiry reminder to {m.user.telegram_id}: {e}")
+                    .exists(),
+                    *conditions
+                )
+                .options(selectinload(Membership.user))
+                .options(selectinload(Membership.channel))
+            )
+
+            sent_ids = [
+                m.id for m in result.scalars().all()
+                if await send_reminder(m, kind, now)
+            ]
+            await mark_reminded(session, kind, sent_ids)
+            await session.commit()
+            reminder_count += len(sent_ids)
+
+    if reminder_count > 0:
+        print(f"✅ Sent {reminder_count} reminder(s)")
+    else:
+        print("✅ No reminders to send at this time")
+
+
+async def mark_reminded(session, kind: str, membership_ids: list[int]):
+    """Set the reminded_* flag of a kind on many memberships in one UPDATE."""
+    flag = REMINDER_FLAGS[kind]
+    if not flag or not membership_ids:
+        return
+    await session.execute(
+        update(Membership)
+        .where(Membership.id == any_(bindparam("ids", membership_ids, type_=ARRAY(Integer))))
+        .values({flag: True})
+        .execution_options(synchronize_session=False)
+    )
+
+
+# =========================================================
+# MESSAGES
+# =========================================================
+
+async def send_reminder(m: Membership, kind: str, now: datetime) -> bool:
+    """Send one reminder of the given kind. Returns True when delivered."""
+    expiry_tz = m.expiry_date
+    if expiry_tz.tzinfo is None:
+        expiry_tz = expiry_tz.replace(tzinfo=timezone.utc)
+
+    # Renew button
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text="🔄 Renew Now",
+            callback_data=f"userch_{m.channel_id}"
+        )],
+        [InlineKeyboardButton(
+            text="📋 My Plans",
+            callback_data="my_plans"
+        )]
+    ])
+
+    if kind == "7d":
+        label = "7-day"
+        text = (
+            f"⏰ <b>Reminder: Your Membership Expires Soon</b>\n\n"
+            f"📺 Channel: <b>{m.channel.name}</b>\n"
+            f"📅 Expires on: <b>{expiry_tz.strftime('%d %b %Y')}</b>\n"
+            f"⏳ Time left: <b>7 days</b>\n\n"
+            f"💡 Renew now to keep enjoying uninterrupted access.\n\n"
+            f"Tap below to renew 👇"
+        )
+    elif kind == "1d":
+        label = "1-day"
+        text = (
+            f"⏰ <b>Reminder: Your Membership Expires Soon</b>\n\n"
+            f"📺 Channel: <b>{m.channel.name}</b>\n"
+            f"📅 Expires on: <b>{expiry_tz.strftime('%d %b %Y')}</b>\n"
+            f"⏳ Time left: <b>Less than 24 hours</b>\n\n"
+            f"💡 Renew now to keep enjoying uninterrupted access.\n\n"
+            f"Tap below to renew 👇"
+        )
+    elif kind == "expiry_day":
+        label = "Expiry-day"
+        hours_remaining = int((expiry_tz - now).total_seconds() / 3600)
+        text = (
+            f"🔴 <b>Final Reminder: Membership Expires Today</b>\n\n"
+            f"📺 Channel: <b>{m.channel.name}</b>\n"
+            f"📅 Expires today at: <b>{expiry_tz.strftime('%I:%M %p')}</b>\n"
+            f"⏳ Time left: <b>~{hours_remaining} hours</b>\n\n"
+            f"⚡ Renew now to keep your access active."
+        )
+    else:
+        label = "Post-expiry"
+        text = (
+            f"⌛ <b>Your Membership Has Expired</b>\n\n"
+            f"📺 Channel: <b>{m.channel.name}</b>\n"
+            f"Access to this channel has ended.\n\n"
+            f"🔄 Renew now to regain access instantly."
+        )
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(
+                text="🔄 Renew Now",
+                callback_data=f"userch_{m.channel_id}"
+            )]
+        ])
+
+    try:
+        await bot.send_message(
+            chat_id=m.user.telegram_id,
+            text=text,
+            reply_markup=keyboard,
+            parse_mode="HTML"
+        )
+    except Exception as e:
+        print(f"⚠️ Failed to send {label.lower()} reminder to {m.user.telegram_id}: {e}")
+        return False
 
-        await session.commit()
-        
-        if reminder_count > 0:
-            print(f"✅ Sent {reminder_count} reminder(s)")
-        else:
-            print("✅ No reminders to send at this time")
+    print(f"✅ {label} reminder sent to user {m.user.telegram_id} for {m.channel.name}")
+    return True
 
 
 async def scheduled_reminder_task():
@@ -168,4 +215,4 @@ async def scheduled_reminder_task():
             await run_reminder_check()
         except Exception as e:
             print(f"❌ Reminder task error: {e}")
-        await asyncio.sleep(3600)  # Run every 1 hour
\ No newline at end of file
+        await asyncio.sleep(3600)  # Run every 1 hour
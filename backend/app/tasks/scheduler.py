@@ -1,7 +1,26 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+
+from apscheduler.events import (
+    EVENT_JOB_SUBMITTED,
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_ERROR,
+    EVENT_JOB_MISSED,
+    EVENT_JOB_MAX_INSTANCES,
+)
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.util import obj_to_ref
 from backend.app.tasks.expiry_checker import run_expiry_check
 from backend.app.tasks.reminder_worker import run_reminder_check
+from backend.app.tasks.upsell_sender import send_upsell_offers
+from backend.app.services.update_dedup import prune_processed_updates
+from backend.app.services.reminder_outbox import drain_reminder_outbox, REMINDER_POLL_SECONDS
 from backend.app.tasks.reports import (
     send_daily_report,
     send_weekly_report,
@@ -10,69 +29,276 @@ from backend.app.tasks.reports import (
     send_member_daily_report,
     send_excel_report,
 )
+from sqlalchemy import text
 
-scheduler = AsyncIOScheduler()
+from backend.app.db.session import engine, SYNC_DATABASE_URL
 
-def start_scheduler():
+# =========================================================
+# SCHEDULER
+#
+# Jobs live in Postgres (apscheduler_jobs) so next run times
+# survive restarts: start_scheduler() only adds jobs that are
+# missing and leaves the stored next_run_time of the rest
+# alone. The store is synchronous (psycopg2) and is read on
+# every scheduler wakeup, so frequent pollers stay in the
+# "memory" store. Every web process runs a SchedulerLeader;
+# only the one holding the pg advisory lock SCHEDULER_LOCK_KEY
+# starts the scheduler, so with several uvicorn workers each
+# job still runs once. The lock belongs to a dedicated
+# connection: if that process dies or the connection drops,
+# Postgres releases it and another process takes over within
+# SCHEDULER_LEADER_POLL seconds.
+# =========================================================
+
+SCHEDULER_LOCK_KEY = int(os.getenv("SCHEDULER_LOCK_KEY", "7243001"))
+SCHEDULER_LEADER_POLL = int(os.getenv("SCHEDULER_LEADER_POLL", "15"))
+
+# Run policy: a job never overlaps itself (max_instances=1). When
+# the scheduler resumes after downtime, sync_jobs() has kept each
+# stored next_run_time, so the runs missed meanwhile collapse into
+# one (coalesce) that fires at once if the latest of them is
+# within the grace time, and is skipped otherwise. Reports get a
+# longer grace — a late report beats none. The 03:30 report jobs
+# are staggered five minutes apart so they don't share the pool.
+JOB_MISFIRE_GRACE = int(os.getenv("JOB_MISFIRE_GRACE", "300"))
+REPORT_MISFIRE_GRACE = int(os.getenv("REPORT_MISFIRE_GRACE", "3600"))
+
+scheduler = AsyncIOScheduler(
+    jobstores={
+        "default": SQLAlchemyJobStore(url=SYNC_DATABASE_URL, tablename="apscheduler_jobs"),
+        "memory": MemoryJobStore(),
+    },
+    job_defaults={
+        "max_instances": 1,
+        "coalesce": True,
+        "misfire_grace_time": JOB_MISFIRE_GRACE,
+    }
+)
+
+
+# =========================================================
+# JOB METRICS
+# =========================================================
+
+class JobMetrics:
+    """Per-job run counts and durations, fed by scheduler events."""
+
+    def __init__(self):
+        self._jobs: dict = {}
+        self._started: dict = {}
+
+    def _job(self, job_id: str) -> dict:
+        return self._jobs.setdefault(job_id, {
+            "runs": 0,
+            "failures": 0,
+            "missed": 0,
+            "overlaps_skipped": 0,
+            "running": False,
+            "total_s": 0.0,
+            "last_s": None,
+            "max_s": 0.0,
+            "last_started_at": None,
+            "last_error": None,
+        })
+
+    def on_event(self, event):
+        job = self._job(event.job_id)
+        if event.code == EVENT_JOB_SUBMITTED:
+            self._started[event.job_id] = time.monotonic()
+            job["running"] = True
+            job["last_started_at"] = datetime.now(timezone.utc).isoformat()
+        elif event.code in (EVENT_JOB_EXECUTED, EVENT_JOB_ERROR):
+            started = self._started.pop(event.job_id, None)
+            job["running"] = False
+            job["runs"] += 1
+            if started is not None:
+                duration = time.monotonic() - started
+                job["total_s"] += duration
+                job["last_s"] = round(duration, 2)
+                job["max_s"] = max(job["max_s"], duration)
+            if event.code == EVENT_JOB_ERROR:
+                job["failures"] += 1
+                job["last_error"] = repr(event.exception)
+        elif event.code == EVENT_JOB_MISSED:
+            job["missed"] += 1
+        elif event.code == EVENT_JOB_MAX_INSTANCES:
+            job["overlaps_skipped"] += 1
+
+    def stats(self) -> dict:
+        jobs = {}
+        for job_id, job in self._jobs.items():
+            jobs[job_id] = {
+                **job,
+                "total_s": round(job["total_s"], 2),
+                "max_s": round(job["max_s"], 2),
+                "avg_s": round(job["total_s"] / job["runs"], 2) if job["runs"] else None,
+            }
+        if scheduler.running:
+            for scheduled in scheduler.get_jobs():
+                entry = jobs.setdefault(scheduled.id, {})
+                entry["next_run_at"] = scheduled.next_run_time.isoformat() if scheduled.next_run_time else None
+        return jobs
+
+
+job_metrics = JobMetrics()
+scheduler.add_listener(
+    job_metrics.on_event,
+    EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES
+)
+
+
+# (job id, function, trigger, add_job options)
+JOBS = [
     # Expiry check – every hour
-    scheduler.add_job(
-        run_expiry_check,
-        CronTrigger(minute=0),
-        id="expiry_check",
-        replace_existing=True
-    )
-    # Reminder worker – 9 AM & 6 PM UTC
-    scheduler.add_job(
-        run_reminder_check,
-        CronTrigger(hour="9,18", minute=0),
-        id="reminder_check",
-        replace_existing=True
-    )
+    ("expiry_check", run_expiry_check, CronTrigger(minute=0), {}),
+    # Reminder outbox – due reminders, polled continuously. Kept in
+    # memory: nothing to catch up on, and persisting it would write
+    # apscheduler_jobs every poll
+    ("reminder_outbox", drain_reminder_outbox, IntervalTrigger(seconds=REMINDER_POLL_SECONDS), {
+        "jobstore": "memory",
+        "misfire_grace_time": REMINDER_POLL_SECONDS,
+    }),
+    # Reminder sweep (reminders the outbox doesn't cover) – 9 AM & 6 PM UTC
+    ("reminder_check", run_reminder_check, CronTrigger(hour="9,18", minute=0), {}),
     # Daily revenue report – 9 AM IST (3:30 UTC)
-    scheduler.add_job(
-        send_daily_report,
-        CronTrigger(hour=3, minute=30),
-        id="daily_report",
-        replace_existing=True
-    )
-    # Daily member report – 9 AM IST (3:30 UTC)
-    scheduler.add_job(
-        send_member_daily_report,
-        CronTrigger(hour=3, minute=30),
-        id="member_daily_report",
-        replace_existing=True
-    )
-    # Daily Excel report – 9 AM IST (3:30 UTC)
-    scheduler.add_job(
-        send_excel_report,
-        CronTrigger(hour=3, minute=30),
-        id="excel_report",
-        replace_existing=True
-    )
-    # Weekly report – Monday 9 AM IST
-    scheduler.add_job(
-        send_weekly_report,
-        CronTrigger(day_of_week="mon", hour=3, minute=30),
-        id="weekly_report",
-        replace_existing=True
-    )
-    # Monthly report – 1st day 9 AM IST
-    scheduler.add_job(
-        send_monthly_report,
-        CronTrigger(day=1, hour=3, minute=30),
-        id="monthly_report",
-        replace_existing=True
-    )
-    # Yearly report – Jan 1st 9 AM IST
-    scheduler.add_job(
-        send_yearly_report,
-        CronTrigger(month=1, day=1, hour=3, minute=30),
-        id="yearly_report",
-        replace_existing=True
-    )
-    scheduler.start()
+    ("daily_report", send_daily_report, CronTrigger(hour=3, minute=30), {
+        "misfire_grace_time": REPORT_MISFIRE_GRACE,
+    }),
+    # Daily member report – 9:05 AM IST (3:35 UTC)
+    ("member_daily_report", send_member_daily_report, CronTrigger(hour=3, minute=35), {
+        "misfire_grace_time": REPORT_MISFIRE_GRACE,
+    }),
+    # Daily Excel report – 9:10 AM IST (3:40 UTC)
+    ("excel_report", send_excel_report, CronTrigger(hour=3, minute=40), {
+        "misfire_grace_time": REPORT_MISFIRE_GRACE,
+    }),
+    # Weekly report – Monday 9:15 AM IST (3:45 UTC)
+    ("weekly_report", send_weekly_report, CronTrigger(day_of_week="mon", hour=3, minute=45), {
+        "misfire_grace_time": REPORT_MISFIRE_GRACE,
+    }),
+    # Monthly report – 1st day 9:20 AM IST (3:50 UTC)
+    ("monthly_report", send_monthly_report, CronTrigger(day=1, hour=3, minute=50), {
+        "misfire_grace_time": REPORT_MISFIRE_GRACE,
+    }),
+    # Yearly report – Jan 1st 9:25 AM IST (3:55 UTC)
+    ("yearly_report", send_yearly_report, CronTrigger(month=1, day=1, hour=3, minute=55), {
+        "misfire_grace_time": REPORT_MISFIRE_GRACE,
+    }),
+    # Upsell offers (day 5 after purchase) – 10 AM IST (4:30 UTC)
+    ("upsell_offers", send_upsell_offers, CronTrigger(hour=4, minute=30), {}),
+    # Processed update ids cleanup – daily
+    ("prune_processed_updates", prune_processed_updates, CronTrigger(hour=2, minute=0), {}),
+]
+
+
+def sync_jobs(scheduler, jobs):
+    """
+    Make the scheduler's jobs match `jobs` without touching the
+    next run time of jobs that already exist, so runs that fell
+    due while no process was leading are caught up (or counted
+    as missed) when the scheduler resumes. Only a changed
+    trigger reschedules a job; jobs no longer listed are removed.
+    """
+    wanted = {(job_id, options.get("jobstore", "default")) for job_id, _, _, options in jobs}
+    for store in ("default", "memory"):
+        for job in scheduler.get_jobs(jobstore=store):
+            if (job.id, store) not in wanted:
+                scheduler.remove_job(job.id, jobstore=store)
+
+    for job_id, func, trigger, options in jobs:
+        store = options.get("jobstore", "default")
+        existing = scheduler.get_job(job_id, jobstore=store)
+        if existing is None:
+            scheduler.add_job(func, trigger, id=job_id, **options)
+            continue
+
+        if str(existing.trigger) != str(trigger):
+            scheduler.reschedule_job(job_id, jobstore=store, trigger=trigger)
+        grace = options.get("misfire_grace_time", JOB_MISFIRE_GRACE)
+        if existing.func_ref != obj_to_ref(func) or existing.misfire_grace_time != grace:
+            scheduler.modify_job(job_id, jobstore=store, func=func, misfire_grace_time=grace)
+
+
+def start_scheduler():
+    # Paused until the jobs are in place: nothing runs off a
+    # half-synced job list, and overdue jobs fire on resume()
+    scheduler.start(paused=True)
+    sync_jobs(scheduler, JOBS)
+    scheduler.resume()
     print("✅ Scheduler started (daily / weekly / monthly / yearly / excel reports enabled)")
 
 def stop_scheduler():
-    scheduler.shutdown()
-    print("🛑 Scheduler stopped")
\ No newline at end of file
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+        print("🛑 Scheduler stopped")
+
+
+class SchedulerLeader:
+
+    def __init__(self, lock_key: int = SCHEDULER_LOCK_KEY, poll: int = SCHEDULER_LEADER_POLL):
+        self.lock_key = lock_key
+        self.poll = poll
+        self.is_leader = False
+        self._conn = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="scheduler-leader")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._step_down()
+
+    async def _run(self):
+        while True:
+            try:
+                if self._conn is None:
+                    await self._try_acquire()
+                else:
+                    # The lock lives as long as this connection does
+                    await self._conn.execute(text("SELECT 1"))
+                    await self._conn.commit()
+            except Exception as e:
+                print(f"⚠️ Scheduler leader connection lost: {e}")
+                await self._step_down()
+            await asyncio.sleep(self.poll)
+
+    async def _try_acquire(self):
+        conn = await engine.connect()
+        try:
+            result = await conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key}
+            )
+            acquired = result.scalar()
+            await conn.commit()
+        except Exception:
+            await conn.close()
+            raise
+        if not acquired:
+            await conn.close()
+            return
+
+        self._conn = conn
+        self.is_leader = True
+        print(f"👑 This process is the scheduler leader (pid {os.getpid()})")
+        start_scheduler()
+
+    async def _step_down(self):
+        if self.is_leader:
+            stop_scheduler()
+            self.is_leader = False
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            try:
+                # Dropping the connection releases the advisory lock
+                await conn.invalidate()
+                await conn.close()
+            except Exception:
+                pass
+
+
+scheduler_leader = SchedulerLeader()
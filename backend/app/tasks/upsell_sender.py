@@ -1,19 +1,27 @@
 """
 Scheduled Upsell Sender - Runs daily, sends upsell offers on Day 5 after purchase
-Add this to backend/app/tasks/upsell_sender.py
+
+Scheduled in backend/app/tasks/scheduler.py. Each run covers memberships
+created since the previous run's window (persisted in job_watermarks) up
+to 5 days ago, so restarts and redeploys neither skip nor repeat a day.
 """
 
 from datetime import datetime, timedelta, timezone
 from sqlalchemy import select, and_
+from sqlalchemy.orm import selectinload
 from backend.app.db.session import async_session
-from backend.app.db.models import Membership, User, Channel, UpsellAttempt
+from backend.app.db.models import Membership, User, UpsellAttempt, JobWatermark
 from backend.bot.bot import bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-import asyncio
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+UPSELL_CONCURRENCY = int(os.getenv("UPSELL_CONCURRENCY", "10"))
+UPSELL_AFTER_DAYS = 5
+UPSELL_WATERMARK = "upsell_offers"
+
 # Upsell mapping with 20% discount
 UPSELL_MAP = {
     30: {"to_days": 90, "from_price": 49, "to_price": 119, "discount_pct": 20},    # 1M → 3M (Tier 1)
@@ -50,56 +58,64 @@ def calculate_upsell_price(tier: int, from_days: int, to_days: int) -> dict:
 
 async def send_upsell_offers():
     """
-    Run daily - Find memberships that are exactly 5 days old
+    Run daily - Find memberships that turned 5 days old since the last run
     Send upsell offers if applicable
     """
     async with async_session() as db:
-        # Calculate date 5 days ago
-        five_days_ago = datetime.now(timezone.utc) - timedelta(days=5)
-        five_days_start = five_days_ago.replace(hour=0, minute=0, second=0, microsecond=0)
-        five_days_end = five_days_ago.replace(hour=23, minute=59, second=59, microsecond=999999)
-        
-        # Find memberships created exactly 5 days ago
+        # Window: (last watermark, 5 days ago]. The first run starts at
+        # the beginning of the day 5 days ago.
+        window_end = datetime.now(timezone.utc) - timedelta(days=UPSELL_AFTER_DAYS)
+        watermark = await db.get(JobWatermark, UPSELL_WATERMARK, with_for_update=True)
+        if watermark is None:
+            watermark = JobWatermark(
+                name=UPSELL_WATERMARK,
+                value=window_end.replace(hour=0, minute=0, second=0, microsecond=0)
+            )
+            db.add(watermark)
+        window_start = watermark.value
+        watermark.value = window_end
+
+        # Memberships created in the window on a plan that has an
+        # upsell (all under 1 year) and no upsell attempt yet — users and
+        # channels loaded with them
+        already_offered = (
+            select(UpsellAttempt.id)
+            .where(
+                UpsellAttempt.user_id == Membership.user_id,
+                UpsellAttempt.channel_id == Membership.channel_id,
+                UpsellAttempt.from_validity_days == Membership.validity_days
+            )
+            .exists()
+        )
         result = await db.execute(
-            select(Membership).where(
+            select(Membership)
+            .join(User, User.id == Membership.user_id)
+            .where(
                 and_(
-                    Membership.created_at >= five_days_start,
-                    Membership.created_at <= five_days_end,
-                    Membership.is_active == True
+                    Membership.created_at > window_start,
+                    Membership.created_at <= window_end,
+                    Membership.is_active == True,
+                    Membership.validity_days.in_(UPSELL_MAP),
+                    User.is_blocked == False,
+                    ~already_offered
                 )
             )
+            .options(selectinload(Membership.user))
+            .options(selectinload(Membership.channel))
         )
         memberships = result.scalars().all()
-        
-        logger.info(f"Found {len(memberships)} memberships from 5 days ago")
-        
+
+        logger.info(f"Found {len(memberships)} memberships created {window_start:%d %b %H:%M} – {window_end:%d %b %H:%M}")
+
+        offers = []
+        seen = set()
         for membership in memberships:
+            key = (membership.user_id, membership.channel_id, membership.validity_days)
+            if key in seen:
+                continue
+            seen.add(key)
+
             try:
-                # Check if already sent upsell for this membership
-                existing = await db.execute(
-                    select(UpsellAttempt).where(
-                        and_(
-                            UpsellAttempt.user_id == membership.user_id,
-                            UpsellAttempt.channel_id == membership.channel_id,
-                            UpsellAttempt.from_validity_days == membership.validity_days
-                        )
-                    )
-                )
-                if existing.scalar_one_or_none():
-                    continue  # Already sent
-                
-                # Check if upsell is available for this plan
-                if membership.validity_days not in UPSELL_MAP:
-                    continue  # No upsell for this duration
-                
-                # Skip if lifetime or 1-year plan
-                if membership.validity_days >= 365:
-                    continue
-                
-                # Get user and channel
-                user = await db.get(User, membership.user_id)
-                channel = await db.get(Channel, membership.channel_id)
-                
                 # Calculate upsell pricing
                 upsell_info = UPSELL_MAP[membership.validity_days]
                 pricing = calculate_upsell_price(
@@ -107,65 +123,67 @@ async def send_upsell_offers():
                     membership.validity_days,
                     upsell_info["to_days"]
                 )
-                
-                # Create upsell attempt record
-                upsell_attempt = UpsellAttempt(
-                    user_id=membership.user_id,
-                    channel_id=membership.channel_id,
-                    from_validity_days=membership.validity_days,
-                    to_validity_days=upsell_info["to_days"],
-                    from_amount=pricing["from_price"],
-                    to_amount=pricing["to_price"],
-                    discount_amount=pricing["discount_amount"],
-                    accepted=False
-                )
-                db.add(upsell_attempt)
-                await db.commit()
-                
-                # Send upsell message
-                duration_map = {30: "1 month", 90: "3 months", 120: "4 months", 180: "6 months", 365: "1 year"}
-                from_duration = duration_map.get(membership.validity_days, f"{membership.validity_days} days")
-                to_duration = duration_map.get(upsell_info["to_days"], f"{upsell_info['to_days']} days")
-                
-                keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(
-                        text=f"🎁 Upgrade to {to_duration.title()}",
-                        callback_data=f"upsell_accept_{upsell_attempt.id}"
-                    )],
-                    [InlineKeyboardButton(text="❌ No Thanks", callback_data=f"upsell_decline_{upsell_attempt.id}")]
-                ])
-                
-                await bot.send_message(
-                    user.telegram_id,
-                    f"🎁 <b>Special Upgrade Offer!</b>\n\n"
-                    f"You're enjoying <b>{channel.name}</b>!\n\n"
-                    f"<b>Upgrade Now:</b>\n"
-                    f"From: {from_duration} → {to_duration}\n\n"
-                    f"💰 Original Price: ₹{pricing['original_price']:.0f}\n"
-                    f"🎉 Your Price: ₹{pricing['to_price']:.0f}\n"
-                    f"💸 You Save: ₹{pricing['discount_amount']:.0f} (20% OFF)\n\n"
-                    f"✨ Limited time offer!",
-                    parse_mode="HTML",
-                    reply_markup=keyboard
-                )
-                
-                logger.info(f"Sent upsell offer to user {user.telegram_id} for channel {channel.name}")
-                await asyncio.sleep(1)  # Rate limiting
-                
             except Exception as e:
-                logger.error(f"Error sending upsell for membership {membership.id}: {e}")
+                logger.error(f"Error pricing upsell for membership {membership.id}: {e}")
                 continue
 
+            # Create upsell attempt record
+            upsell_attempt = UpsellAttempt(
+                user_id=membership.user_id,
+                channel_id=membership.channel_id,
+                from_validity_days=membership.validity_days,
+                to_validity_days=upsell_info["to_days"],
+                from_amount=pricing["from_price"],
+                to_amount=pricing["to_price"],
+                discount_amount=pricing["discount_amount"],
+                accepted=False
+            )
+            offers.append((membership, upsell_attempt, pricing))
+
+        # Attempts and the new watermark are committed together
+        db.add_all([attempt for _, attempt, _ in offers])
+        await db.commit()
+
+    if not offers:
+        return
+
+    # Sends go through the shared rate limiter on the bot session
+    await run_bounded(offers, lambda offer: _send_upsell(*offer), UPSELL_CONCURRENCY)
+    logger.info(f"Sent {len(offers)} upsell offer(s)")
 
-# Add this to your cron job or scheduler
-# Run once daily at 10 AM
-async def scheduled_upsell_task():
-    """Background task to send upsell offers daily"""
-    while True:
-        try:
-            await send_upsell_offers()
-        except Exception as e:
-            logger.error(f"Scheduled upsell task error: {e}")
-        
-        # Run once per day (24 hours)
-        await asyncio.sleep(86400)
\ No newline at end of file
+
+async def _send_upsell(membership: Membership, upsell_attempt: UpsellAttempt, pricing: dict):
+    user = membership.user
+    channel = membership.channel
+    upsell_info = UPSELL_MAP[membership.validity_days]
+
+    # Send upsell message
+    duration_map = {30: "1 month", 90: "3 months", 120: "4 months", 180: "6 months", 365: "1 year"}
+    from_duration = duration_map.get(membership.validity_days, f"{membership.validity_days} days")
+    to_duration = duration_map.get(upsell_info["to_days"], f"{upsell_info['to_days']} days")
+
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text=f"🎁 Upgrade to {to_duration.title()}",
+            callback_data=f"upsell_accept_{upsell_attempt.id}"
+        )],
+        [InlineKeyboardButton(text="❌ No Thanks", callback_data=f"upsell_decline_{upsell_attempt.id}")]
+    ])
+
+    try:
+        await bot.send_message(
+            user.telegram_id,
+            f"🎁 <b>Special Upgrade Offer!</b>\n\n"
+            f"You're enjoying <b>{channel.name}</b>!\n\n"
+            f"<b>Upgrade Now:</b>\n"
+            f"From: {from_duration} → {to_duration}\n\n"
+            f"💰 Original Price: ₹{pricing['original_price']:.0f}\n"
+            f"🎉 Your Price: ₹{pricing['to_price']:.0f}\n"
+            f"💸 You Save: ₹{pricing['discount_amount']:.0f} (20% OFF)\n\n"
+            f"✨ Limited time offer!",
+            parse_mode="HTML",
+            reply_markup=keyboard
+        )
+        logger.info(f"Sent upsell offer to user {user.telegram_id} for channel {channel.name}")
+    except Exception as e:
+        logger.error(f"Error sending upsell for membership {membership.id}: {e}")
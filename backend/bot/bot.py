@@ -16,9 +16,17 @@ bot = Bot(
     default=DefaultBotProperties(parse_mode=ParseMode.HTML)
 )
 
+# Shared Telegram API rate limit for every sender
+from backend.app.services.rate_limiter import rate_limiter
+bot.session.middleware(rate_limiter)
+
 # Create dispatcher
 dp = Dispatcher()
 
+# One DB session + resolved User per update, injected into handlers
+from backend.app.bot.middlewares.db_session import DbSessionMiddleware
+dp.update.outer_middleware(DbSessionMiddleware())
+
 # Register routers
 from backend.app.bot.handlers import upi_payment
 dp.include_router(upi_payment.router)
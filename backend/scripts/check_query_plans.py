@@ -0,0 +1,186 @@
+"""
+EXPLAIN check for the hot query paths.
+
+Runs EXPLAIN on each query the background jobs and handlers issue most
+often and verifies the planner can serve it from the index added for it
+(see backend/app/db/migrations.py). Exits non-zero if an index is
+missing or a query is planned without it.
+
+Usage:
+    python backend/scripts/check_query_plans.py [--planner-default]
+
+By default sequential scans are disabled for the session, so the check
+answers "is there a usable index?" even on a small dev database where
+the planner would rightly prefer a seq scan. On tables with fewer than
+SMALL_TABLE rows the planner may also pick any index at all; that is
+reported as a warning, not a failure. Pass --planner-default against a
+production-sized database to see the plans it would really use.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy import text
+
+from backend.app.db.session import engine
+
+NOW = datetime.now(timezone.utc)
+SMALL_TABLE = 1000
+
+# name, index expected in the plan, SQL, parameters
+HOT_QUERIES = [
+    (
+        "expiry check batch",
+        "ix_memberships_active_expiry",
+        "SELECT id FROM memberships WHERE is_active = true AND expiry_date < :now "
+        "ORDER BY expiry_date, id LIMIT 200",
+        {"now": NOW},
+    ),
+    (
+        "7-day reminder window",
+        "ix_memberships_active_expiry",
+        "SELECT id FROM memberships WHERE is_active = true "
+        "AND expiry_date >= :start AND expiry_date < :end AND reminded_7d IS NOT true",
+        {"start": NOW + timedelta(days=7), "end": NOW + timedelta(days=8)},
+    ),
+    (
+        "post-expiry reminder window",
+        "ix_memberships_expiry_date",
+        "SELECT id FROM memberships WHERE is_active = false "
+        "AND expiry_date >= :start AND expiry_date <= :end",
+        {"start": NOW - timedelta(hours=5), "end": NOW - timedelta(hours=4)},
+    ),
+    (
+        "reminder outbox poll",
+        "ix_reminder_outbox_pending_due",
+        "SELECT id FROM reminder_outbox WHERE status = 'pending' AND due_at <= :now "
+        "ORDER BY due_at LIMIT 100",
+        {"now": NOW},
+    ),
+    (
+        "user by telegram_id",
+        "ix_users_telegram_id",
+        "SELECT id FROM users WHERE telegram_id = :telegram_id",
+        {"telegram_id": 5793624035},
+    ),
+    (
+        "user's active memberships",
+        "ix_memberships_user_channel",
+        "SELECT id FROM memberships WHERE user_id = :user_id AND is_active = true",
+        {"user_id": 1},
+    ),
+    (
+        "user's membership in a channel",
+        "ix_memberships_user_channel",
+        "SELECT id FROM memberships WHERE user_id = :user_id AND channel_id = :channel_id "
+        "AND is_active = true",
+        {"user_id": 1, "channel_id": 1},
+    ),
+    (
+        "channel audience",
+        "ix_memberships_channel_active",
+        "SELECT DISTINCT user_id FROM memberships WHERE channel_id = :channel_id AND is_active = true",
+        {"channel_id": 1},
+    ),
+    (
+        "razorpay subscription lookup",
+        "ix_memberships_razorpay_subscription_id",
+        "SELECT id FROM memberships WHERE razorpay_subscription_id = :subscription_id",
+        {"subscription_id": "sub_check"},
+    ),
+    (
+        "memberships created in range",
+        "ix_memberships_created_at",
+        "SELECT id FROM memberships WHERE created_at BETWEEN :start AND :end",
+        {"start": NOW - timedelta(days=1), "end": NOW},
+    ),
+    (
+        "upsell already offered",
+        "ix_upsell_attempts_user_channel_days",
+        "SELECT id FROM upsell_attempts WHERE user_id = :user_id AND channel_id = :channel_id "
+        "AND from_validity_days = :days",
+        {"user_id": 1, "channel_id": 1, "days": 30},
+    ),
+    (
+        "captured revenue in range",
+        "ix_payments_status_created",
+        "SELECT sum(amount) FROM payments WHERE status = 'captured' "
+        "AND created_at BETWEEN :start AND :end",
+        {"start": NOW - timedelta(days=1), "end": NOW},
+    ),
+    (
+        "user's captured payments",
+        "ix_payments_user_id",
+        "SELECT sum(amount) FROM payments WHERE user_id = :user_id AND status = 'captured'",
+        {"user_id": 1},
+    ),
+]
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+async def check(planner_default: bool) -> bool:
+    ok = True
+    async with engine.connect() as conn:
+        if not planner_default:
+            await conn.execute(text("SET enable_seqscan = off"))
+
+        for name, index, sql, params in HOT_QUERIES:
+            result = await conn.execute(
+                text(
+                    "SELECT t.reltuples FROM pg_class i "
+                    "JOIN pg_index x ON x.indexrelid = i.oid "
+                    "JOIN pg_class t ON t.oid = x.indrelid "
+                    "WHERE i.relname = :index"
+                ),
+                {"index": index}
+            )
+            rows = result.scalar()
+            if rows is None:
+                ok = False
+                print(f"❌ {name:<32} index {index} does not exist — run the migrations")
+                continue
+
+            result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params)
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            nodes = list(plan_nodes(plan[0]["Plan"]))
+            indexes = {n["Index Name"] for n in nodes if "Index Name" in n}
+            seq_scans = {n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan"}
+
+            if index in indexes:
+                print(f"✅ {name:<32} {index}")
+            elif indexes and rows < SMALL_TABLE:
+                print(f"⚠️ {name:<32} expected {index}, got {', '.join(sorted(indexes))} (table too small to tell)")
+            else:
+                ok = False
+                used = ", ".join(sorted(indexes)) or f"seq scan on {', '.join(sorted(seq_scans))}"
+                print(f"❌ {name:<32} expected {index}, got {used}")
+
+    await engine.dispose()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--planner-default", action="store_true",
+                        help="keep sequential scans enabled (use on production-sized data)")
+    args = parser.parse_args()
+
+    ok = asyncio.run(check(args.planner_default))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
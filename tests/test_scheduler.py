@@ -0,0 +1,105 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/test")
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:test")
+
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+
+from backend.app.tasks.scheduler import JOB_MISFIRE_GRACE, sync_jobs
+
+runs = []
+
+
+async def tick():
+    runs.append(datetime.now(timezone.utc))
+
+
+JOBS = [("tick", tick, IntervalTrigger(hours=1), {})]
+
+
+def _new_scheduler(url):
+    return AsyncIOScheduler(
+        jobstores={"default": SQLAlchemyJobStore(url=url)},
+        job_defaults={"max_instances": 1, "coalesce": True, "misfire_grace_time": JOB_MISFIRE_GRACE},
+    )
+
+
+async def _start(url, settle=0.5):
+    scheduler = _new_scheduler(url)
+    scheduler.start(paused=True)
+    sync_jobs(scheduler, JOBS)
+    scheduler.resume()
+    await asyncio.sleep(settle)
+    return scheduler
+
+
+async def _stop(scheduler):
+    scheduler.shutdown(wait=False)
+    await asyncio.sleep(0.1)
+
+
+def _set_next_run(url, job_id, next_run_time):
+    # What the store holds after the leader was down for a while
+    store = SQLAlchemyJobStore(url=url)
+    store.start(None, "default")
+    job = store.lookup_job(job_id)
+    job.next_run_time = next_run_time
+    store.update_job(job)
+    store.shutdown()
+
+
+def test_restart_keeps_next_run_time(tmp_path):
+    url = f"sqlite:///{tmp_path / 'jobs.sqlite'}"
+
+    async def main():
+        first = await _start(url, settle=0)
+        scheduled = first.get_job("tick").next_run_time
+        await _stop(first)
+
+        second = await _start(url, settle=0)
+        assert second.get_job("tick").next_run_time == scheduled
+        await _stop(second)
+
+    asyncio.run(main())
+
+
+def test_restart_runs_overdue_job_once(tmp_path):
+    url = f"sqlite:///{tmp_path / 'jobs.sqlite'}"
+    runs.clear()
+
+    async def main():
+        await _stop(await _start(url, settle=0))
+
+        # Three runs fell due while no process was leading; the last
+        # one is inside the grace time
+        overdue = datetime.now(timezone.utc) - timedelta(hours=2, minutes=1)
+        _set_next_run(url, "tick", overdue)
+
+        scheduler = await _start(url)
+        assert len(runs) == 1
+        assert scheduler.get_job("tick").next_run_time == overdue + timedelta(hours=3)
+        await _stop(scheduler)
+
+    asyncio.run(main())
+
+
+def test_restart_skips_run_past_grace_time(tmp_path):
+    url = f"sqlite:///{tmp_path / 'jobs.sqlite'}"
+    runs.clear()
+
+    async def main():
+        await _stop(await _start(url, settle=0))
+
+        overdue = datetime.now(timezone.utc) - timedelta(seconds=JOB_MISFIRE_GRACE + 60)
+        _set_next_run(url, "tick", overdue)
+
+        scheduler = await _start(url)
+        assert runs == []
+        assert scheduler.get_job("tick").next_run_time == overdue + timedelta(hours=1)
+        await _stop(scheduler)
+
+    asyncio.run(main())